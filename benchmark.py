@@ -0,0 +1,622 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+离线可复现的性能基准套件（GDW 抓取/下载 + 花瓣相关性计算/绘制）
+
+功能概述（中文注释，便于本地二次开发）：
+1. 本地 HTTP 桩服务器（stub）：按配置生成多层网页树（扇出、深度、每页文件数），
+   文件端点返回确定性内容，可设置文件大小、响应延迟与抖动、是否支持 Range（206 断点续传），
+   并可对指定文件的前若干次请求注入 503 失败，用于覆盖重试路径；
+2. 合成数据生成：读取 scripts/variables_selected_47.csv 的真实 47 变量清单，
+   按 collinearity_removed.csv 的列布局（id, species, lon, lat, source, <变量>, presence）
+   分块生成出现点/背景点表，规模 1 万 ~ 1000 万行，按 (行数, 种子) 缓存复用；
+3. 基准组件：
+       crawl    → gdw_download.crawl_and_collect（对桩服务器抓取整棵网页树）
+       download → gdw_download.download_with_requests（逐个下载桩服务器的全部文件）
+       petal    → 04b_petal_correlation_plot.py 的读取/代表值/相关性/绘制/保存各步骤
+                  （变量分组取自 47 变量清单的 category 列，覆盖全部变量）
+   每个组件（及每个数据规模）在独立子进程中运行，峰值内存互不干扰；
+4. 复用 instrumentation.py 埋点：汇总每个 span 的次数、P50/P95/P99 延迟、吞吐量（MB/s、行/秒）
+   与峰值内存，写出 <out>/bench_report_<时间戳>.json 与 bench_report_latest.json；
+5. 可指定 --baseline 与历史报告比较，超过阈值的耗时/内存增长标记为回退（退出码 1）。
+
+使用方法：
+    python benchmark.py run                                  # 默认：crawl + download + petal(1万行)
+    python benchmark.py run --components petal --rows 10000,1000000,10000000
+    python benchmark.py run --latency-ms 50 --fail-every 5 --baseline .bench/bench_report_latest.json
+    python benchmark.py serve --port 8765 --fanout 4 --depth 2   # 仅启动桩服务器，便于手工调试
+    python benchmark.py gen-data --rows 100000                   # 仅生成合成数据
+
+注意：
+    - 全程离线，不访问 Figshare，也不需要私有的 collinearity_removed.csv；
+    - 注入失败时 download_with_requests 会按既有逻辑退避 2×attempt 秒，耗时中包含该等待；
+    - 1000 万行合成表约 5 GB，生成耗时较长，首次生成后按文件名缓存。
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import datetime as dt
+import importlib.util
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import instrumentation as instr
+
+
+# ----------------------------- 常量与全局配置 -----------------------------
+
+ROOT = Path(__file__).resolve().parent
+
+# 真实 47 变量清单与花瓣图脚本
+VARIABLES_CSV = ROOT / "scripts" / "variables_selected_47.csv"
+PETAL_SCRIPT = ROOT / "scripts" / "04b_petal_correlation_plot.py"
+
+# 默认输出目录（报告、日志、合成数据缓存、下载临时目录）
+DEFAULT_OUT = ROOT / ".bench"
+
+# 合成坐标范围（中国大陆近似外包框）
+LON_RANGE = (73.0, 135.0)
+LAT_RANGE = (18.0, 54.0)
+
+# 合成数据分块行数（控制生成时的内存占用）
+GEN_CHUNK_ROWS = 500_000
+
+# 报告中展示的组件指标列
+REPORT_SPANS = {
+    "crawl": ["crawl", "fetch_page"],
+    "download": ["download"],
+    "petal": ["load_data", "group_summary", "correlation_compute", "render", "savefig", "export_tables"],
+}
+
+
+# ----------------------------- 工具函数 -----------------------------
+
+def parse_size(text: str) -> int:
+    """解析 '512KB' / '4MB' / '1GB' / '1000' 形式的字节数。"""
+    m = re.fullmatch(r"\s*([\d.]+)\s*([KMG]?B?)\s*", text.upper())
+    if not m:
+        raise argparse.ArgumentTypeError(f"无法解析大小：{text}")
+    unit = {"": 1, "B": 1, "K": 1024, "KB": 1024, "M": 1024 ** 2, "MB": 1024 ** 2,
+            "G": 1024 ** 3, "GB": 1024 ** 3}[m.group(2)]
+    return int(float(m.group(1)) * unit)
+
+
+def parse_rows(text: str) -> List[int]:
+    """解析 '10000,1e6,10M' 形式的行数列表。"""
+    out: List[int] = []
+    for part in text.split(","):
+        part = part.strip().upper()
+        if not part:
+            continue
+        mult = 1
+        if part[-1] in "KM":
+            mult = 1000 if part[-1] == "K" else 1_000_000
+            part = part[:-1]
+        out.append(int(float(part) * mult))
+    return out
+
+
+def load_variable_names(path: Path = VARIABLES_CSV) -> List[Tuple[str, str]]:
+    """读取 47 变量清单，返回 [(变量名, 类别)]。"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [(row["variable"], row["category"]) for row in csv.DictReader(f)]
+
+
+# ----------------------------- 本地 HTTP 桩服务器 -----------------------------
+
+@dataclass
+class StubConfig:
+    """桩服务器配置：网页树结构、文件大小、延迟与失败注入。"""
+    fanout: int = 4               # 每个网页链接的子网页数
+    depth: int = 2                # 网页树深度（0 表示只有首页）
+    files_per_page: int = 2       # 每个网页链接的文件数
+    file_size: int = 1024 ** 2    # 单文件字节数
+    latency_ms: float = 0.0       # 每次响应前的固定延迟
+    jitter_ms: float = 0.0        # 额外的均匀随机延迟 [0, jitter]
+    range_support: bool = True    # 是否支持 Range 请求（206）
+    fail_every: int = 0           # 每隔 N 个文件注入失败（0 = 不注入）
+    fail_attempts: int = 1        # 被注入文件的前几次请求返回 503
+    seed: int = 20251024
+
+
+class StubSite:
+    """按配置预先展开的网页树与文件表（确定性，便于多次运行对比）。"""
+
+    def __init__(self, cfg: StubConfig) -> None:
+        self.cfg = cfg
+        self.pages: Dict[str, List[str]] = {}
+        self.files: Dict[str, int] = {}
+        self.attempts: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.rng = random.Random(cfg.seed)
+        # 文件内容：64 KB 确定性块循环填充
+        self.block = random.Random(cfg.seed).randbytes(64 * 1024)
+        self._build("/", 0)
+
+    def _build(self, path: str, depth: int) -> None:
+        links: List[str] = []
+        if depth < self.cfg.depth:
+            for j in range(self.cfg.fanout):
+                child = f"{path.rstrip('/')}/p{j}/"
+                links.append(child)
+                self._build(child, depth + 1)
+        for _ in range(self.cfg.files_per_page):
+            name = f"/files/{len(self.files):06d}.zip"
+            self.files[name] = len(self.files)
+            links.append(name)
+        # 回链首页：覆盖抓取器的去重逻辑
+        links.append("/")
+        self.pages[path] = links
+
+    def should_fail(self, path: str) -> bool:
+        """被注入文件的前 fail_attempts 次请求失败；计数按路径累计，与并发顺序无关。"""
+        if self.cfg.fail_every <= 0 or self.files.get(path, 1) % self.cfg.fail_every != 0:
+            return False
+        with self.lock:
+            n = self.attempts.get(path, 0)
+            self.attempts[path] = n + 1
+        return n < self.cfg.fail_attempts
+
+    def delay(self) -> None:
+        with self.lock:
+            jitter = self.rng.uniform(0, self.cfg.jitter_ms) if self.cfg.jitter_ms > 0 else 0.0
+        wait = (self.cfg.latency_ms + jitter) / 1000
+        if wait > 0:
+            time.sleep(wait)
+
+
+def parse_byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """解析单段 `bytes=a-b` / `bytes=a-` / `bytes=-n`；返回闭区间 (start, end)，不可满足时返回 None。"""
+    m = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if not m or not (m.group(1) or m.group(2)):
+        return None
+    if m.group(1):
+        start = int(m.group(1))
+        end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+    else:
+        start = max(0, size - int(m.group(2)))
+        end = size - 1
+    if start >= size or start > end:
+        return None
+    return start, end
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """网页返回 HTML 链接列表；文件返回确定性字节流（支持 Range 与 keep-alive）。"""
+
+    protocol_version = "HTTP/1.1"
+    site: StubSite = None  # 由 start_stub_server 注入
+
+    def log_message(self, fmt, *args) -> None:  # noqa: D401
+        pass
+
+    def do_HEAD(self) -> None:
+        self._serve(head=True)
+
+    def do_GET(self) -> None:
+        self._serve(head=False)
+
+    def _send(self, status: int, ctype: str, body: bytes = b"", headers: Optional[Dict[str, str]] = None,
+              length: Optional[int] = None, head: bool = False) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body) if length is None else length))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if body and not head:
+            self.wfile.write(body)
+
+    def _serve(self, head: bool) -> None:
+        site = self.site
+        path = self.path.split("?")[0]
+        site.delay()
+        if path in site.pages:
+            items = "".join(f'<li><a href="{lk}">{lk}</a></li>' for lk in site.pages[path])
+            body = f"<html><body><ul>{items}</ul></body></html>".encode("utf-8")
+            self._send(200, "text/html; charset=utf-8", body, head=head)
+            return
+        if path not in site.files:
+            self._send(404, "text/plain", b"not found", head=head)
+            return
+        if site.should_fail(path):
+            self._send(503, "text/plain", b"injected failure", head=head)
+            return
+
+        size = site.cfg.file_size
+        start, end, status = 0, size - 1, 200
+        headers = {"Accept-Ranges": "bytes" if site.cfg.range_support else "none"}
+        rng = self.headers.get("Range")
+        if rng and site.cfg.range_support:
+            span = parse_byte_range(rng, size)
+            if span is None:
+                self._send(416, "text/plain", b"", headers={"Content-Range": f"bytes */{size}"}, head=head)
+                return
+            start, end = span
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        self._send(status, "application/zip", headers=headers, length=end - start + 1, head=head)
+        if head:
+            return
+        # 分块写出：按 64 KB 确定性块的偏移取数
+        block = site.block
+        pos = start
+        try:
+            while pos <= end:
+                off = pos % len(block)
+                n = min(len(block) - off, end - pos + 1, 256 * 1024)
+                self.wfile.write(block[off:off + n])
+                pos += n
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端提前断开（如超时或中止下载）不视为服务端错误
+            self.close_connection = True
+
+
+def start_stub_server(cfg: StubConfig, port: int = 0) -> Tuple[ThreadingHTTPServer, StubSite, str]:
+    """在后台线程启动桩服务器；返回 (server, site, 根 URL)。"""
+    site = StubSite(cfg)
+    handler = type("BoundStubHandler", (StubHandler,), {"site": site})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, site, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+# ----------------------------- 合成数据生成 -----------------------------
+
+def synthetic_data_path(out_dir: Path, rows: int, seed: int) -> Path:
+    return out_dir / "data" / f"synthetic_{rows}_{seed}.csv"
+
+
+def generate_synthetic_table(path: Path, rows: int, seed: int = 20251024, prevalence: float = 0.1) -> Path:
+    """按 collinearity_removed.csv 的列布局分块生成合成出现点/背景点表（已存在则复用）。
+
+    变量由所属类别的共享潜变量加独立噪声构成（组内相关、组间弱相关），
+    出现概率为少数变量的 logistic 函数，截距按目标出现率校准。
+    """
+    import numpy as np
+    import pandas as pd
+
+    if path.exists() and path.stat().st_size > 0:
+        return path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    variables = load_variable_names()
+    categories = sorted({c for _, c in variables})
+    cat_idx = np.array([categories.index(c) for _, c in variables])
+    rng = np.random.default_rng(seed)
+    loading = rng.uniform(0.4, 0.9, size=len(variables))
+    scale = rng.lognormal(mean=2.0, sigma=1.5, size=len(variables))
+    center = rng.normal(0, 50, size=len(variables))
+    beta = np.zeros(len(variables))
+    beta[rng.choice(len(variables), size=6, replace=False)] = rng.normal(0, 1.0, size=6)
+    intercept = np.log(prevalence / (1 - prevalence))
+
+    tmp = path.with_suffix(".csv.tmp")
+    written = 0
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        while written < rows:
+            n = min(GEN_CHUNK_ROWS, rows - written)
+            latent = rng.standard_normal((n, len(categories)))
+            z = latent[:, cat_idx] * loading + rng.standard_normal((n, len(variables))) * np.sqrt(1 - loading ** 2)
+            presence = (rng.random(n) < 1 / (1 + np.exp(-(intercept + z @ beta)))).astype(np.int8)
+            chunk = pd.DataFrame(z * scale + center, columns=[v for v, _ in variables]).round(4)
+            chunk.insert(0, "id", np.arange(written + 1, written + n + 1))
+            chunk.insert(1, "species", np.where(presence == 1, "Synthetic_species", "background"))
+            chunk.insert(2, "lon", rng.uniform(*LON_RANGE, size=n).round(5))
+            chunk.insert(3, "lat", rng.uniform(*LAT_RANGE, size=n).round(5))
+            chunk.insert(4, "source", np.where(presence == 1, "occurrence", "background"))
+            chunk["presence"] = presence
+            chunk.to_csv(f, index=False, header=(written == 0))
+            written += n
+    os.replace(tmp, path)
+    return path
+
+
+# ----------------------------- 基准组件（子进程内执行） -----------------------------
+
+def _import_gdw():
+    sys.path.insert(0, str(ROOT))
+    import gdw_download
+    return gdw_download
+
+
+def _load_petal_module():
+    """按文件路径加载 04b 脚本（文件名以数字开头，无法直接 import）。"""
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    spec = importlib.util.spec_from_file_location("petal_correlation_plot", PETAL_SCRIPT)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def bench_crawl(spec: Dict) -> Dict:
+    gdw = _import_gdw()
+    with instr.span("crawl", max_depth=spec["depth"]) as sp:
+        files, gdrive, pages = gdw.crawl_and_collect([spec["base_url"]], max_depth=spec["depth"],
+                                                     timeout=spec["timeout"])
+        sp.update(pages=len(pages), direct_files=len(files))
+    return {"pages": len(pages), "files": len(files)}
+
+
+def bench_download(spec: Dict) -> Dict:
+    gdw = _import_gdw()
+    out_dir = Path(tempfile.mkdtemp(prefix="bench_download_", dir=spec["work_dir"]))
+    ok_n = 0
+    nbytes = 0
+    for url in spec["file_urls"]:
+        ok, saved, size = gdw.download_with_requests(url, out_dir, timeout=spec["timeout"])
+        ok_n += int(ok)
+        nbytes += size
+        if saved and os.path.exists(saved):
+            os.remove(saved)
+    return {"files": len(spec["file_urls"]), "ok": ok_n, "bytes": nbytes}
+
+
+def bench_petal(spec: Dict) -> Dict:
+    mod = _load_petal_module()
+    path = Path(spec["data_path"])
+    with instr.span("load_data", bytes=path.stat().st_size) as sp:
+        data, env_data, env_columns = mod.load_env_data(str(path))
+        sp.update(rows=len(data), columns=len(env_columns))
+    # 按 47 变量清单的 category 分组（与脚本的前缀分组解耦，保证全部变量参与计算）
+    categories = dict(load_variable_names())
+    var_groups: Dict[str, List[str]] = {}
+    for col in env_columns:
+        var_groups.setdefault(categories.get(col, "Other"), []).append(col)
+    with instr.span("group_summary", n_groups=len(var_groups), rows=len(env_data)):
+        group_data_df = mod.compute_group_representatives(env_data, var_groups)
+    with instr.span("correlation_compute", method=mod.selected_method, rows=len(env_data)):
+        corr = mod.compute_correlations(env_data, group_data_df, var_groups, verbose=False)
+    with instr.span("render", n_groups=len(var_groups)):
+        fig = mod.render_petal_plot(corr, var_groups)
+    out_dir = Path(tempfile.mkdtemp(prefix="bench_petal_", dir=spec["work_dir"]))
+    png_path = out_dir / "petal_correlation_plot.png"
+    with instr.span("savefig", format="png", dpi=spec["dpi"]) as sp:
+        fig.savefig(png_path, dpi=spec["dpi"], bbox_inches="tight", facecolor="white")
+        sp["bytes"] = png_path.stat().st_size
+    with instr.span("export_tables") as sp:
+        sp["bytes"] = mod.export_tables(corr, str(out_dir / "petal_tables"))
+    return {"rows": len(data), "columns": len(env_columns), "groups": len(var_groups)}
+
+
+COMPONENTS = {"crawl": bench_crawl, "download": bench_download, "petal": bench_petal}
+
+
+def run_component_child(spec_path: Path) -> None:
+    """子进程入口：执行单个组件并写出 instrumentation 汇总。"""
+    spec = json.loads(spec_path.read_text(encoding="utf-8"))
+    instr.init_run(spec["run_name"], Path(spec["log_dir"]), component=spec["component"])
+    result = COMPONENTS[spec["component"]](spec)
+    summary = instr.finish_run(print_summary=False)
+    summary["result"] = result
+    Path(spec["result_path"]).write_text(json.dumps(summary, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+def launch_component(spec: Dict, out_dir: Path) -> Optional[Dict]:
+    """在独立子进程中运行组件，返回汇总（失败返回 None，输出写入日志）。"""
+    work = out_dir / "runs"
+    work.mkdir(parents=True, exist_ok=True)
+    spec_path = work / f"{spec['run_name']}.spec.json"
+    spec["result_path"] = str(work / f"{spec['run_name']}.result.json")
+    spec["log_dir"] = str(out_dir / "logs")
+    spec["work_dir"] = str(work)
+    spec_path.write_text(json.dumps(spec, ensure_ascii=False), encoding="utf-8")
+    log_path = work / f"{spec['run_name']}.out"
+    env = dict(os.environ, MPLBACKEND="Agg", PYTHONIOENCODING="utf-8")
+    with open(log_path, "w", encoding="utf-8") as log:
+        proc = subprocess.run([sys.executable, str(Path(__file__).resolve()), "_component", str(spec_path)],
+                              stdout=log, stderr=subprocess.STDOUT, cwd=str(ROOT), env=env)
+    if proc.returncode != 0:
+        print(f"  ✗ {spec['run_name']} 失败（退出码 {proc.returncode}），详见 {log_path}")
+        return None
+    return json.loads(Path(spec["result_path"]).read_text(encoding="utf-8"))
+
+
+# ----------------------------- 报告 -----------------------------
+
+def component_metrics(component: str, summary: Dict) -> Dict:
+    """从汇总中提取组件级指标：吞吐量、延迟分位数与峰值内存。"""
+    result = summary.get("result", {})
+    wall = summary["wall_sec"]
+    out = {"wall_sec": wall, "peak_rss_mb": summary["peak_rss_mb"], **result}
+    if component == "crawl":
+        out["pages_per_sec"] = round(result.get("pages", 0) / wall, 2) if wall > 0 else None
+    elif component == "download":
+        out["throughput_mbps"] = round(result.get("bytes", 0) / 1024 ** 2 / wall, 3) if wall > 0 else None
+        out["retries"] = summary["counters"].get("retries", 0)
+    elif component == "petal":
+        out["rows_per_sec"] = round(result.get("rows", 0) / wall, 1) if wall > 0 else None
+    return out
+
+
+def format_report(report: Dict) -> str:
+    lines = ["=" * 100, f"基准报告 {report['started']} | {report['python']} | {report['platform']}", "=" * 100]
+    for run in report["runs"]:
+        m = run["metrics"]
+        extra = ", ".join(f"{k}={v}" for k, v in m.items() if k not in ("wall_sec", "peak_rss_mb"))
+        lines.append(f"[{run['name']}] 总耗时 {m['wall_sec']:.2f} 秒 | 峰值内存 {m['peak_rss_mb']:.1f} MB | {extra}")
+        lines.append(f"  {'span':24s}{'次数':>6s}{'P50(秒)':>10s}{'P95':>9s}{'P99':>9s}{'最大':>9s}{'MB/s':>9s}{'峰值MB':>9s}")
+        for name in REPORT_SPANS[run["component"]]:
+            s = run["summary"]["spans"].get(name)
+            if s is None:
+                continue
+            tp = f"{s['throughput_mbps']:.2f}" if s.get("throughput_mbps") else "-"
+            lines.append(f"  {name:24s}{s['count']:>6d}{s['p50_sec']:>10.4f}{s['p95_sec']:>9.4f}"
+                         f"{s.get('p99_sec', float('nan')):>9.4f}{s['max_sec']:>9.4f}{tp:>9s}"
+                         f"{s['max_peak_rss_mb']:>9.1f}")
+    lines.append("=" * 100)
+    return "\n".join(lines)
+
+
+def compare_reports(old: Dict, new: Dict, threshold: float) -> List[Dict]:
+    """按运行名称配对，逐个调用 instrumentation.compare_summaries。"""
+    old_runs = {r["name"]: r for r in old.get("runs", [])}
+    rows: List[Dict] = []
+    for run in new["runs"]:
+        base = old_runs.get(run["name"])
+        if base is None:
+            continue
+        for r in instr.compare_summaries(base["summary"], run["summary"], threshold):
+            r["metric"] = f"{run['name']}:{r['metric']}"
+            rows.append(r)
+    return rows
+
+
+# ----------------------------- 主流程 -----------------------------
+
+def cmd_run(args: argparse.Namespace) -> int:
+    out_dir = Path(args.out).resolve()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    components = [c.strip() for c in args.components.split(",") if c.strip()]
+    cfg = stub_config_from_args(args)
+    report = {
+        "started": dt.datetime.now().strftime("%Y%m%d_%H%M%S"),
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "stub": asdict(cfg),
+        "runs": [],
+    }
+    specs: List[Dict] = []
+    server = None
+    if {"crawl", "download"} & set(components):
+        server, site, base_url = start_stub_server(cfg)
+        print(f"桩服务器: {base_url} | 网页 {len(site.pages)} 个 | 文件 {len(site.files)} 个"
+              f" × {cfg.file_size / 1024 ** 2:.2f} MB")
+        if "crawl" in components:
+            specs.append({"component": "crawl", "run_name": "bench_crawl", "base_url": base_url,
+                          "depth": cfg.depth, "timeout": args.timeout})
+        if "download" in components:
+            specs.append({"component": "download", "run_name": "bench_download", "timeout": args.timeout,
+                          "file_urls": [base_url.rstrip("/") + p for p in site.files]})
+    if "petal" in components:
+        for rows in parse_rows(args.rows):
+            path = synthetic_data_path(out_dir, rows, args.seed)
+            t0 = time.perf_counter()
+            generate_synthetic_table(path, rows, args.seed)
+            print(f"合成数据: {path.name} | {rows:,} 行 | 准备用时 {time.perf_counter() - t0:.1f} 秒")
+            specs.append({"component": "petal", "run_name": f"bench_petal_{rows}",
+                          "data_path": str(path), "dpi": args.dpi})
+
+    try:
+        for spec in specs:
+            print(f"运行: {spec['run_name']} ...")
+            summary = launch_component(spec, out_dir)
+            if summary is None:
+                continue
+            report["runs"].append({"name": spec["run_name"], "component": spec["component"],
+                                   "metrics": component_metrics(spec["component"], summary),
+                                   "summary": summary})
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    (out_dir / f"bench_report_{report['started']}.json").write_text(text, encoding="utf-8")
+    (out_dir / "bench_report_latest.json").write_text(text, encoding="utf-8")
+    print(format_report(report))
+
+    status = 0 if len(report["runs"]) == len(specs) else 1
+    if args.baseline:
+        old = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        rows = compare_reports(old, report, args.threshold)
+        for r in rows:
+            flag = "回退" if r["regression"] else ""
+            print(f"{r['metric']:56s}{r['old']:>12.3f}{r['new']:>12.3f}{r['change'] * 100:>9.1f}%  {flag}")
+        if any(r["regression"] for r in rows):
+            status = 1
+    return status
+
+
+def cmd_serve(args: argparse.Namespace) -> int:
+    cfg = stub_config_from_args(args)
+    server, site, base_url = start_stub_server(cfg, port=args.port)
+    print(f"桩服务器运行中: {base_url} | 网页 {len(site.pages)} 个 | 文件 {len(site.files)} 个（Ctrl+C 退出）")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+def cmd_gen_data(args: argparse.Namespace) -> int:
+    out_dir = Path(args.out).resolve()
+    for rows in parse_rows(args.rows):
+        t0 = time.perf_counter()
+        path = generate_synthetic_table(synthetic_data_path(out_dir, rows, args.seed), rows, args.seed)
+        print(f"{path} | {rows:,} 行 | {path.stat().st_size / 1024 ** 2:.1f} MB | {time.perf_counter() - t0:.1f} 秒")
+    return 0
+
+
+def stub_config_from_args(args: argparse.Namespace) -> StubConfig:
+    return StubConfig(fanout=args.fanout, depth=args.depth, files_per_page=args.files_per_page,
+                      file_size=args.file_size, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                      range_support=not args.no_range, fail_every=args.fail_every,
+                      fail_attempts=args.fail_attempts, seed=args.seed)
+
+
+def add_stub_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--fanout", type=int, default=4, help="每个网页的子网页数")
+    p.add_argument("--depth", type=int, default=2, help="网页树深度（同时作为抓取深度）")
+    p.add_argument("--files-per-page", type=int, default=2, help="每个网页链接的文件数")
+    p.add_argument("--file-size", type=parse_size, default=parse_size("1MB"), help="单文件大小，如 512KB / 4MB")
+    p.add_argument("--latency-ms", type=float, default=0.0, help="每次响应的固定延迟（毫秒）")
+    p.add_argument("--jitter-ms", type=float, default=0.0, help="额外随机延迟上限（毫秒）")
+    p.add_argument("--no-range", action="store_true", help="关闭 Range（206）支持")
+    p.add_argument("--fail-every", type=int, default=0, help="每隔 N 个文件注入 503 失败（0 = 不注入）")
+    p.add_argument("--fail-attempts", type=int, default=1, help="被注入文件的前几次请求失败")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="离线可复现的性能基准套件")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    # 各子命令共用的随机种子参数（桩服务器与合成数据）
+    seed_p = argparse.ArgumentParser(add_help=False)
+    seed_p.add_argument("--seed", type=int, default=20251024, help="随机种子（桩服务器与合成数据）")
+
+    run_p = sub.add_parser("run", parents=[seed_p], help="运行基准并输出报告")
+    run_p.add_argument("--components", default="crawl,download,petal", help="逗号分隔：crawl,download,petal")
+    run_p.add_argument("--rows", default="10000", help="petal 合成数据行数，如 10K,1M,10M")
+    run_p.add_argument("--dpi", type=int, default=300, help="petal 保存 PNG 的分辨率（脚本正式输出为 1200）")
+    run_p.add_argument("--timeout", type=int, default=30, help="HTTP 超时（秒）")
+    run_p.add_argument("--out", default=str(DEFAULT_OUT), help="输出目录")
+    run_p.add_argument("--baseline", default=None, help="用于比较的历史 bench_report_*.json")
+    run_p.add_argument("--threshold", type=float, default=0.2, help="回退判定的相对增长阈值")
+    add_stub_args(run_p)
+
+    serve_p = sub.add_parser("serve", parents=[seed_p], help="仅启动桩服务器")
+    serve_p.add_argument("--port", type=int, default=8765)
+    add_stub_args(serve_p)
+
+    gen_p = sub.add_parser("gen-data", parents=[seed_p], help="仅生成合成数据")
+    gen_p.add_argument("--rows", default="10000")
+    gen_p.add_argument("--out", default=str(DEFAULT_OUT))
+
+    child_p = sub.add_parser("_component", help=argparse.SUPPRESS)
+    child_p.add_argument("spec")
+
+    args = parser.parse_args()
+    if args.cmd == "_component":
+        run_component_child(Path(args.spec))
+        return
+    handlers = {"run": cmd_run, "serve": cmd_serve, "gen-data": cmd_gen_data}
+    sys.exit(handlers[args.cmd](args))
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,10 @@ GDW（Global Dam Watch）数据自动抓取与下载脚本
 4. 对直接文件链接使用 requests 流式断点式下载，对 Google Drive 链接使用 gdown 下载；
 5. 跳过已存在且非空的文件，支持失败重试与超时设置；
 6. 输出完整的下载清单（manifest_gdw.csv）与日志，便于复现实验流程；
+7. 网络请求共用按线程复用的连接池会话（get_session）与统一的重试/退避逻辑（request_with_retry），
+   参考文献抓取（literature_fetch.py）等其它 Python 阶段直接复用；
+8. 通过 instrumentation 模块记录抓取/单文件下载的耗时、字节数、吞吐量、重试次数与峰值内存
+   （logs/gdw_download_*.jsonl 与运行汇总 gdw_download_summary_*.json）；
 
 使用方法（Windows）：
     配置好 Python 环境与依赖后，直接在命令行执行：
@@ -30,13 +34,15 @@ import logging
 import os
 import re
 import sys
+import threading
 import time
 from pathlib import Path
-from typing import Iterable, List, Tuple, Dict, Set
+from typing import Iterable, List, Optional, Tuple, Dict, Set
 
 # -------- 依赖检查 --------
 try:
     import requests
+    from requests.adapters import HTTPAdapter
     from bs4 import BeautifulSoup
     from tqdm import tqdm
     # lxml 是 beautifulsoup 高效解析所必需的
@@ -49,6 +55,9 @@ except ImportError as e:
     sys.exit(1)
 
 
+# 结构化埋点（同目录下的 instrumentation.py，仅依赖标准库）
+import instrumentation as instr
+
 # gdown 用于 Google Drive 链接的稳定下载
 try:
     import gdown  # type: ignore
@@ -90,6 +99,12 @@ DEFAULT_HEADERS = {
     "Accept-Language": "en-US,en;q=0.9",
 }
 
+# 连接池大小（每个主机保持的复用连接数，应不小于并发请求数）
+POOL_SIZE = 16
+
+# 视为可重试的 HTTP 状态码（限流与服务端临时错误）
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
 
 # ----------------------------- 工具函数：路径与日志 -----------------------------
 
@@ -115,18 +130,80 @@ def setup_logging(log_dir: Path) -> None:
 
 # ----------------------------- 网络与解析 -----------------------------
 
+_SESSIONS = threading.local()
+
+
+def make_session(pool_size: int = POOL_SIZE, headers: Optional[Dict[str, str]] = None) -> requests.Session:
+    """创建带连接池的会话（keep-alive 复用 TCP/TLS 连接）；重试由 request_with_retry 统一负责。"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(DEFAULT_HEADERS if headers is None else headers)
+    return session
+
+
+def get_session() -> requests.Session:
+    """返回当前线程复用的会话（requests.Session 非线程安全，故每个线程一个）。"""
+    session = getattr(_SESSIONS, "session", None)
+    if session is None:
+        session = make_session()
+        _SESSIONS.session = session
+    return session
+
+
+def request_with_retry(
+    method: str,
+    url: str,
+    session: Optional[requests.Session] = None,
+    max_retry: int = 3,
+    backoff: float = 2.0,
+    retry_statuses: Tuple[int, ...] = RETRY_STATUSES,
+    **kwargs,
+) -> requests.Response:
+    """带重试的请求：网络异常或可重试状态码按 backoff×attempt 秒退避（优先遵循 Retry-After）。
+
+    - 返回最后一次的 Response（可能仍为错误状态，交由上层判定）；
+    - 所有尝试均抛出异常时，抛出最后一次异常；
+    - 每次重试计入 instrumentation 计数器 retries。
+    """
+    session = session or get_session()
+    kwargs.setdefault("allow_redirects", True)
+    last_exc: Optional[Exception] = None
+    resp: Optional[requests.Response] = None
+    for attempt in range(1, max_retry + 1):
+        wait = backoff * attempt
+        try:
+            resp = session.request(method, url, **kwargs)
+            if resp.status_code not in retry_statuses:
+                return resp
+            retry_after = resp.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                wait = float(retry_after)
+            last_exc = None
+            logging.warning("第 %s 次请求返回 HTTP %s：%s", attempt, resp.status_code, url)
+        except requests.RequestException as e:
+            last_exc = e
+            logging.warning("第 %s 次请求失败：%s | 错误：%s", attempt, url, e)
+        if attempt < max_retry:
+            instr.count("retries")
+            if resp is not None:
+                resp.close()
+            time.sleep(wait)
+    if last_exc is not None:
+        raise last_exc
+    return resp
+
+
 def http_get(url: str, timeout: int = 30) -> requests.Response:
     """发起 GET 请求，返回 Response；异常由上层处理。
 
     为了稳健性：
-    - 使用默认请求头；
+    - 使用默认请求头与线程内复用的连接池会话；
     - 由调用方控制重试；
     - 不在此处直接抛弃非 200 状态，交由上层判定。
     """
-    session = requests.Session()
-    session.headers.update(DEFAULT_HEADERS)
-    resp = session.get(url, timeout=timeout, allow_redirects=True)
-    return resp
+    return get_session().get(url, timeout=timeout, allow_redirects=True)
 
 
 def is_google_drive_url(url: str) -> bool:
@@ -207,10 +284,18 @@ def crawl_and_collect(
         logging.info(f"正在分析页面 [深度 {depth}]: {url}")
         visited_pages.add(url)
 
-        try:
-            resp = http_get(url, timeout=timeout)
-        except Exception as e:  # noqa: E722
-            logging.warning("访问失败，将跳过：%s | 错误：%s", url, e)
+        resp = None
+        with instr.span("fetch_page", url=url, depth=depth) as sp:
+            try:
+                resp = http_get(url, timeout=timeout)
+                sp["bytes"] = len(resp.content)
+                sp["http_status"] = resp.status_code
+            except Exception as e:  # noqa: E722
+                sp["status"] = "error"
+                sp["error"] = str(e)
+                instr.count("page_errors")
+        if resp is None:
+            logging.warning("访问失败，将跳过：%s | 错误：%s", url, sp.get("error"))
             continue
 
         ctype = resp.headers.get("Content-Type", "").lower()
@@ -276,11 +361,16 @@ def download_with_requests(url: str, out_dir: Path, timeout: int, max_retry: int
     # 已存在且非空则跳过
     if out_path.exists() and out_path.stat().st_size > 0:
         logging.info("已存在且非空，跳过：%s", out_path)
+        instr.count("skipped_existing")
         return True, str(out_path), out_path.stat().st_size
 
+    sp = instr.start_span("download", url=url, file=filename, bytes=0, retries=0)
     for attempt in range(1, max_retry + 1):
+        sp["retries"] = attempt - 1
+        # 每次尝试重新计数：失败尝试写入的部分字节不计入吞吐量
+        sp["bytes"] = 0
         try:
-            with requests.get(url, headers=DEFAULT_HEADERS, stream=True, timeout=timeout) as r:
+            with get_session().get(url, stream=True, timeout=timeout) as r:
                 if r.status_code != 200:
                     raise RuntimeError(f"HTTP {r.status_code}")
                 total = int(r.headers.get("Content-Length", 0))
@@ -294,16 +384,22 @@ def download_with_requests(url: str, out_dir: Path, timeout: int, max_retry: int
                     for part in r.iter_content(chunk_size=chunk):
                         if part:
                             f.write(part)
+                            sp["bytes"] += len(part)
                             if total > 0:
                                 pbar.update(len(part))
             size = out_path.stat().st_size
             logging.info("下载完成：%s | 大小：%s 字节", out_path, size)
+            instr.end_span(sp)
             return True, str(out_path), size
         except Exception as e:  # noqa: E722
             logging.warning("第 %s 次下载失败：%s | 错误：%s", attempt, url, e)
-            time.sleep(2 * attempt)
+            if attempt < max_retry:
+                instr.count("retries")
+                time.sleep(2 * attempt)
 
     logging.error("多次重试后仍失败：%s", url)
+    instr.count("download_failures")
+    instr.end_span(sp, status="error")
     return False, str(out_path), 0
 
 
@@ -316,6 +412,7 @@ def download_with_gdown(url: str, out_dir: Path, timeout: int) -> Tuple[bool, st
         return False, "", 0
 
     # 让 gdown 自动推断文件名；若失败则回退到占位名
+    sp = instr.start_span("download_gdrive", url=url)
     try:
         # gdown.download 支持输出路径，若为目录则会在目录下保存文件
         # 这里我们先切换工作目录以便保留原始文件名
@@ -327,13 +424,21 @@ def download_with_gdown(url: str, out_dir: Path, timeout: int) -> Tuple[bool, st
             os.chdir(cwd)
         if out is None:
             logging.error("gdown 返回空路径，下载失败：%s", url)
+            instr.count("download_failures")
+            instr.end_span(sp, status="error")
             return False, "", 0
         out_path = Path(out)
         size = out_path.stat().st_size if out_path.exists() else 0
         logging.info("下载完成(GDrive)：%s | 大小：%s 字节", out_path, size)
+        sp["file"] = out_path.name
+        sp["bytes"] = size
+        instr.end_span(sp)
         return True, str(out_path), size
     except Exception as e:  # noqa: E722
         logging.error("gdown 下载失败：%s | 错误：%s", url, e)
+        instr.count("download_failures")
+        sp["error"] = str(e)
+        instr.end_span(sp, status="error")
         return False, "", 0
 
 
@@ -380,13 +485,17 @@ def main() -> None:
     ensure_dir(out_dir)
     ensure_dir(raw_dir)
     setup_logging(log_dir)
+    metrics_path = instr.init_run("gdw_download", log_dir, index_url=index_url, max_depth=max_depth)
+    logging.info("埋点事件：%s", metrics_path)
 
     logging.info("开始抓取 GDW 链接 | index=%s | depth=%s", index_url, max_depth)
-    direct_files, gdrive_files, visited_pages = crawl_and_collect(
-        seed_urls=[index_url],
-        max_depth=max_depth,
-        timeout=timeout,
-    )
+    with instr.span("crawl", index_url=index_url, max_depth=max_depth) as sp:
+        direct_files, gdrive_files, visited_pages = crawl_and_collect(
+            seed_urls=[index_url],
+            max_depth=max_depth,
+            timeout=timeout,
+        )
+        sp.update(pages=len(visited_pages), direct_files=len(direct_files), gdrive_files=len(gdrive_files))
 
     logging.info("抓取完成：%s 个网页 | %s 个直接文件 | %s 个GDrive", len(visited_pages), len(direct_files), len(gdrive_files))
 
@@ -433,6 +542,7 @@ def main() -> None:
 
     write_manifest(manifest_path, rows)
     logging.info("全部处理完成 | 清单：%s", manifest_path)
+    instr.finish_run()
 
 
 if __name__ == "__main__":
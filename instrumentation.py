@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Python 阶段的结构化计时 / 内存 / I/O 埋点工具
+
+功能概述（中文注释，便于本地二次开发）：
+1. span：记录一个阶段（抓取、单文件下载、相关性计算、绘制、保存图件等）的
+   墙钟时间、CPU 时间、结束时 RSS 与进程峰值 RSS；
+2. 可在 span 上附加字节数、重试次数等属性，自动计算吞吐量（MB/s）；
+3. 计数器（重试、HTTP 错误、跳过文件等）按运行累计；
+4. 每个事件以一行 JSON 追加写入 <log_dir>/<run>_<时间戳>.jsonl；
+5. 运行结束时输出汇总（按 span 名称聚合：次数、总/均/P50/P95/P99/最大耗时、字节、吞吐量、
+   计数器、峰值内存），另存为 <run>_summary_<时间戳>.json 与 <run>_summary_latest.json；
+6. 命令行比较两次汇总，超过阈值的耗时/内存增长标记为回退：
+       python instrumentation.py compare old_summary.json new_summary.json --threshold 0.2
+
+使用方法：
+    import instrumentation as instr
+    instr.init_run("gdw_download", Path("logs"))
+    with instr.span("download", url=url) as sp:
+        ...
+        sp["bytes"] = nbytes
+    sp = instr.start_span("render"); ...; instr.end_span(sp)   # 脚本式代码无需缩进
+    instr.finish_run()
+
+注意：
+    - 仅依赖标准库；峰值内存在 Linux/macOS 取自 resource，在 Windows 取自
+      GetProcessMemoryInfo（PeakWorkingSetSize）；
+    - 未调用 init_run 时所有接口均为空操作，便于脚本在无埋点环境下照常运行。
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import datetime as dt
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+# ----------------------------- 内存读取 -----------------------------
+
+def _memory_mb() -> Tuple[float, float]:
+    """返回 (当前 RSS, 峰值 RSS)，单位 MB；无法获取时为 NaN。"""
+    rss = peak = float("nan")
+    if sys.platform.startswith("win"):
+        try:
+            import ctypes
+            from ctypes import wintypes
+
+            class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                _fields_ = [
+                    ("cb", wintypes.DWORD),
+                    ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t),
+                    ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t),
+                    ("PeakPagefileUsage", ctypes.c_size_t),
+                ]
+
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            handle = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+                rss = counters.WorkingSetSize / 1024 ** 2
+                peak = counters.PeakWorkingSetSize / 1024 ** 2
+        except Exception:  # noqa: E722
+            pass
+        return rss, peak
+
+    try:
+        import resource
+
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位为 KB，macOS 为字节
+        peak = maxrss / 1024 ** 2 if sys.platform == "darwin" else maxrss / 1024
+    except Exception:  # noqa: E722
+        pass
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        rss = pages * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except Exception:  # noqa: E722
+        rss = peak
+    return rss, peak
+
+
+# ----------------------------- 运行记录器 -----------------------------
+
+class _Run:
+    """单次运行的事件流与聚合状态（线程安全，支持并发下载线程）。"""
+
+    def __init__(self, name: str, log_dir: Path) -> None:
+        log_dir.mkdir(parents=True, exist_ok=True)
+        self.name = name
+        self.log_dir = log_dir
+        self.stamp = dt.datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.path = log_dir / f"{name}_{self.stamp}.jsonl"
+        self.t0 = time.perf_counter()
+        self.cpu0 = time.process_time()
+        self.lock = threading.Lock()
+        self.spans: Dict[str, List[Dict]] = {}
+        self.counters: Dict[str, float] = {}
+        self.fh = open(self.path, "a", encoding="utf-8")
+
+    def emit(self, event: Dict) -> None:
+        event.setdefault("ts", dt.datetime.now().isoformat(timespec="milliseconds"))
+        event.setdefault("run", self.name)
+        line = json.dumps(event, ensure_ascii=False, default=str)
+        with self.lock:
+            self.fh.write(line + "\n")
+            self.fh.flush()
+
+
+_RUN: Optional[_Run] = None
+
+
+def init_run(name: str, log_dir: Path, **attrs) -> Optional[Path]:
+    """开始一次运行；返回 JSONL 事件文件路径。"""
+    global _RUN
+    _RUN = _Run(name, Path(log_dir))
+    rss, peak = _memory_mb()
+    _RUN.emit({"event": "run_start", "pid": os.getpid(), "python": platform.python_version(),
+               "platform": platform.platform(), "rss_mb": rss, "peak_rss_mb": peak, **attrs})
+    return _RUN.path
+
+
+def start_span(name: str, **attrs) -> Dict:
+    """开始一个 span；返回可附加属性（bytes / retries / status 等）的字典。"""
+    return {"name": name, "_t0": time.perf_counter(), "_cpu0": time.process_time(),
+            "_thread": threading.get_ident(), **attrs}
+
+
+def end_span(sp: Dict, status: Optional[str] = None) -> Dict:
+    """结束 span，写出事件并计入聚合；返回事件字典。"""
+    wall = time.perf_counter() - sp["_t0"]
+    rss, peak = _memory_mb()
+    event = {k: v for k, v in sp.items() if not k.startswith("_")}
+    event.update({
+        "event": "span",
+        "wall_sec": round(wall, 6),
+        "rss_mb": round(rss, 2),
+        "peak_rss_mb": round(peak, 2),
+        "status": status or sp.get("status", "ok"),
+    })
+    # CPU 时间为进程级；仅在单线程场景下可解释为该 span 的 CPU 占用
+    if threading.active_count() == 1:
+        event["cpu_sec"] = round(time.process_time() - sp["_cpu0"], 6)
+    nbytes = event.get("bytes")
+    if isinstance(nbytes, (int, float)) and nbytes > 0 and wall > 0:
+        event["throughput_mbps"] = round(nbytes / 1024 ** 2 / wall, 3)
+    if _RUN is not None:
+        _RUN.emit(event)
+        with _RUN.lock:
+            _RUN.spans.setdefault(event["name"], []).append(event)
+    return event
+
+
+@contextlib.contextmanager
+def span(name: str, **attrs) -> Iterator[Dict]:
+    """上下文管理器形式的 span；块内异常记为 status=error 并继续抛出。"""
+    sp = start_span(name, **attrs)
+    try:
+        yield sp
+    except BaseException as e:
+        sp["error"] = f"{type(e).__name__}: {e}"
+        end_span(sp, status="error")
+        raise
+    end_span(sp)
+
+
+def count(name: str, n: float = 1) -> None:
+    """累加计数器（如 retries、http_errors、skipped_existing）。"""
+    if _RUN is None:
+        return
+    with _RUN.lock:
+        _RUN.counters[name] = _RUN.counters.get(name, 0) + n
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    s = sorted(values)
+    k = (len(s) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(s) - 1)
+    return s[lo] + (s[hi] - s[lo]) * (k - lo)
+
+
+def summarize() -> Dict:
+    """按 span 名称聚合当前运行的全部事件。"""
+    if _RUN is None:
+        return {}
+    rss, peak = _memory_mb()
+    spans = {}
+    for name, events in _RUN.spans.items():
+        walls = [e["wall_sec"] for e in events]
+        nbytes = sum(e.get("bytes", 0) or 0 for e in events if isinstance(e.get("bytes"), (int, float)))
+        total = sum(walls)
+        spans[name] = {
+            "count": len(events),
+            "errors": sum(1 for e in events if e.get("status") == "error"),
+            "total_sec": round(total, 4),
+            "mean_sec": round(total / len(walls), 4),
+            "p50_sec": round(_percentile(walls, 0.5), 4),
+            "p95_sec": round(_percentile(walls, 0.95), 4),
+            "p99_sec": round(_percentile(walls, 0.99), 4),
+            "max_sec": round(max(walls), 4),
+            "bytes": nbytes,
+            "throughput_mbps": round(nbytes / 1024 ** 2 / total, 3) if nbytes and total > 0 else None,
+            "retries": sum(e.get("retries", 0) or 0 for e in events),
+            "max_peak_rss_mb": max(e["peak_rss_mb"] for e in events),
+        }
+    return {
+        "run": _RUN.name,
+        "started": _RUN.stamp,
+        "wall_sec": round(time.perf_counter() - _RUN.t0, 4),
+        "cpu_sec": round(time.process_time() - _RUN.cpu0, 4),
+        "peak_rss_mb": round(peak, 2),
+        "final_rss_mb": round(rss, 2),
+        "counters": dict(_RUN.counters),
+        "spans": spans,
+    }
+
+
+def finish_run(print_summary: bool = True) -> Dict:
+    """结束运行：写出汇总事件与汇总 JSON，并（可选）打印汇总表。"""
+    global _RUN
+    if _RUN is None:
+        return {}
+    summary = summarize()
+    _RUN.emit({"event": "run_end", **summary})
+    _RUN.fh.close()
+    text = json.dumps(summary, indent=2, ensure_ascii=False)
+    (_RUN.log_dir / f"{_RUN.name}_summary_{_RUN.stamp}.json").write_text(text, encoding="utf-8")
+    (_RUN.log_dir / f"{_RUN.name}_summary_latest.json").write_text(text, encoding="utf-8")
+    if print_summary:
+        print(format_summary(summary))
+    _RUN = None
+    return summary
+
+
+def format_summary(summary: Dict) -> str:
+    """将汇总格式化为便于阅读的文本表。"""
+    lines = [
+        "-" * 92,
+        f"运行汇总: {summary['run']} | 总耗时 {summary['wall_sec']:.2f} 秒 | CPU {summary['cpu_sec']:.2f} 秒"
+        f" | 峰值内存 {summary['peak_rss_mb']:.1f} MB",
+        f"{'span':28s}{'次数':>6s}{'总(秒)':>10s}{'P50':>9s}{'P95':>9s}{'最大':>9s}{'MB':>10s}{'MB/s':>9s}",
+    ]
+    for name, s in summary["spans"].items():
+        mb = s["bytes"] / 1024 ** 2 if s["bytes"] else 0.0
+        tp = f"{s['throughput_mbps']:.2f}" if s["throughput_mbps"] else "-"
+        lines.append(f"{name:28s}{s['count']:>6d}{s['total_sec']:>10.2f}{s['p50_sec']:>9.3f}"
+                     f"{s['p95_sec']:>9.3f}{s['max_sec']:>9.3f}{mb:>10.1f}{tp:>9s}")
+    if summary["counters"]:
+        lines.append("计数器: " + ", ".join(f"{k}={v:g}" for k, v in sorted(summary["counters"].items())))
+    lines.append("-" * 92)
+    return "\n".join(lines)
+
+
+# ----------------------------- 跨运行比较 -----------------------------
+
+def compare_summaries(old: Dict, new: Dict, threshold: float = 0.2) -> List[Dict]:
+    """比较两次汇总：耗时（span 总耗时与 P95）和峰值内存增长超过阈值记为回退。"""
+    rows: List[Dict] = []
+
+    def add(metric: str, a: Optional[float], b: Optional[float]) -> None:
+        if a is None or b is None or a != a or b != b:
+            return
+        change = (b - a) / a if a > 0 else (float("inf") if b > 0 else 0.0)
+        rows.append({"metric": metric, "old": a, "new": b, "change": change,
+                     "regression": change > threshold})
+
+    add("run.wall_sec", old.get("wall_sec"), new.get("wall_sec"))
+    add("run.peak_rss_mb", old.get("peak_rss_mb"), new.get("peak_rss_mb"))
+    for name in sorted(set(old.get("spans", {})) | set(new.get("spans", {}))):
+        a = old.get("spans", {}).get(name)
+        b = new.get("spans", {}).get(name)
+        if a is None or b is None:
+            continue
+        add(f"{name}.total_sec", a["total_sec"], b["total_sec"])
+        add(f"{name}.p95_sec", a["p95_sec"], b["p95_sec"])
+        add(f"{name}.max_peak_rss_mb", a["max_peak_rss_mb"], b["max_peak_rss_mb"])
+    return rows
+
+
+def main() -> None:
+    """命令行入口：python instrumentation.py compare OLD NEW [--threshold 0.2]"""
+    parser = argparse.ArgumentParser(description="比较两次运行汇总，检测性能回退")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    cmp_p = sub.add_parser("compare", help="比较两个 *_summary_*.json")
+    cmp_p.add_argument("old")
+    cmp_p.add_argument("new")
+    cmp_p.add_argument("--threshold", type=float, default=0.2, help="相对增长阈值（默认 0.2 = 20%%）")
+    args = parser.parse_args()
+
+    old = json.loads(Path(args.old).read_text(encoding="utf-8"))
+    new = json.loads(Path(args.new).read_text(encoding="utf-8"))
+    rows = compare_summaries(old, new, args.threshold)
+    for r in rows:
+        flag = "回退" if r["regression"] else ""
+        print(f"{r['metric']:40s}{r['old']:>12.3f}{r['new']:>12.3f}{r['change'] * 100:>9.1f}%  {flag}")
+    sys.exit(1 if any(r["regression"] for r in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
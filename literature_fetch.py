@@ -0,0 +1,518 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+参考文献元数据异步抓取器（PubMed + Crossref，限速 + 磁盘 TTL 缓存）
+
+功能概述（中文注释，便于本地二次开发）：
+1. 读取 21_reference_builder.R 写出的检索配置（主题检索式、强制收录条目、年份下限、每主题上限）；
+2. PubMed：各主题 esearch 并发执行，全部 PMID 去重后按批（默认 200 个/次）efetch，
+   解析标题/期刊/年份/DOI，逐条按 PMID 缓存，增量重建时只抓取新增 PMID；
+3. Crossref：主题兜底检索、强制收录条目的精确检索、以及缺少期刊/年份条目的 DOI 解析并发执行；
+4. 每个服务一个令牌桶限速（PubMed 无密钥 3 次/秒、有密钥 10 次/秒；Crossref 默认 10 次/秒），
+   另以信号量限制在途请求数；HTTP 请求在线程池中执行，复用 gdw_download.py 的
+   连接池会话（get_session）与重试/退避逻辑（request_with_retry）；
+5. 响应缓存于磁盘（<cache_dir>/<命名空间>/<sha256>.json，先写临时文件再原子替换），
+   按类型设置 TTL（检索结果 7 天、文献记录 180 天、未命中 1 天）；
+6. 输出与 R 端一致的结果表（kind, query, title, journal, year, doi, source），
+   并通过 instrumentation 记录请求耗时、缓存命中与重试次数。
+
+使用方法：
+    python literature_fetch.py --spec references/cache/query_spec.json --out references/cache/fetched_refs.csv
+    # 本地替身服务器测试：
+    python literature_fetch.py --spec spec.json --out out.csv \\
+        --pubmed-base http://127.0.0.1:8765/eutils --crossref-base http://127.0.0.1:8765/crossref
+
+注意：
+    - PubMed API Key 读取环境变量 PUBMED_API_KEY 或 ENTREZ_KEY（R 端已设置 ENTREZ_KEY）；
+    - Crossref 建议通过 --mailto 或环境变量 CROSSREF_MAILTO 提供联系邮箱（进入 polite 池）；
+    - 令牌桶只约束首次请求，request_with_retry 内部的重试按退避时间等待，不再占用令牌。
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import functools
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote
+
+import instrumentation as instr
+from gdw_download import request_with_retry
+
+
+# ----------------------------- 常量与全局配置 -----------------------------
+
+PUBMED_BASE = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+CROSSREF_BASE = "https://api.crossref.org"
+
+# 每次 efetch 的 PMID 数（NCBI 建议 GET 请求不超过 200 个）
+EFETCH_BATCH = 200
+
+# 缓存有效期（秒）
+TTL_SEARCH = 7 * 86400
+TTL_RECORD = 180 * 86400
+TTL_NEGATIVE = 1 * 86400
+
+# 默认限速（次/秒）与在途请求上限
+PUBMED_RATE_NO_KEY = 3.0
+PUBMED_RATE_WITH_KEY = 10.0
+CROSSREF_RATE = 10.0
+DEFAULT_CONCURRENCY = 8
+
+# Crossref 年份字段的解析顺序（与 R 端 cr_find_best 一致）
+CROSSREF_DATE_FIELDS = ("published-print", "issued", "published-online", "created")
+
+OUTPUT_FIELDS = ["kind", "query", "title", "journal", "year", "doi", "source"]
+
+
+# ----------------------------- 限速与缓存 -----------------------------
+
+class TokenBucket:
+    """异步令牌桶：以 rate 次/秒补充令牌，容量 capacity（允许的瞬时突发）。"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        # 持锁等待，保证先到先得
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ResponseCache:
+    """磁盘 TTL 缓存：每个条目一个 JSON 文件，记录写入时间与有效期。"""
+
+    def __init__(self, cache_dir: Path, enabled: bool = True, refresh: bool = False) -> None:
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        self.refresh = refresh
+
+    def _path(self, namespace: str, ident: str) -> Path:
+        digest = hashlib.sha256(ident.encode("utf-8")).hexdigest()
+        return self.cache_dir / namespace / digest[:2] / f"{digest}.json"
+
+    def get(self, namespace: str, ident: str) -> Optional[Any]:
+        if not self.enabled or self.refresh:
+            return None
+        path = self._path(namespace, ident)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            instr.count("cache_misses")
+            return None
+        if time.time() - entry["stored"] > entry["ttl"]:
+            instr.count("cache_expired")
+            return None
+        instr.count("cache_hits")
+        return entry["payload"]
+
+    def put(self, namespace: str, ident: str, payload: Any, ttl: float) -> None:
+        if not self.enabled:
+            return
+        path = self._path(namespace, ident)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".tmp{os.getpid()}")
+        tmp.write_text(json.dumps({"ident": ident, "stored": time.time(), "ttl": ttl, "payload": payload},
+                                  ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def purge_expired(self) -> int:
+        """删除过期条目，返回删除数量。"""
+        removed = 0
+        now = time.time()
+        for path in self.cache_dir.rglob("*.json"):
+            try:
+                entry = json.loads(path.read_text(encoding="utf-8"))
+                if now - entry["stored"] > entry["ttl"]:
+                    path.unlink()
+                    removed += 1
+            except (OSError, ValueError, KeyError):
+                continue
+        return removed
+
+
+# ----------------------------- 解析 -----------------------------
+
+def _valid_year(value: Any) -> Optional[int]:
+    try:
+        year = int(str(value)[:4])
+    except (TypeError, ValueError):
+        return None
+    return year if 1000 <= year <= 3000 else None
+
+
+def parse_pubmed_xml(text: str) -> List[Dict[str, Any]]:
+    """解析 efetch XML：PMID、标题、期刊、出版年、DOI。"""
+    records: List[Dict[str, Any]] = []
+    root = ET.fromstring(text)
+    for art in root.iter("PubmedArticle"):
+        pmid = art.findtext(".//MedlineCitation/PMID")
+        title_el = art.find(".//ArticleTitle")
+        year = _valid_year(art.findtext(".//PubDate/Year"))
+        if year is None:
+            medline = art.findtext(".//PubDate/MedlineDate") or ""
+            m = re.search(r"\d{4}", medline)
+            year = _valid_year(m.group(0)) if m else None
+        doi = None
+        for aid in art.iter("ArticleId"):
+            if aid.get("IdType") == "doi" and aid.text:
+                doi = aid.text.strip()
+                break
+        records.append({
+            "pmid": pmid,
+            "title": "".join(title_el.itertext()).strip() if title_el is not None else None,
+            "journal": art.findtext(".//Journal/Title"),
+            "year": year,
+            "doi": doi,
+        })
+    return records
+
+
+def crossref_year(item: Dict[str, Any]) -> Optional[int]:
+    for field in CROSSREF_DATE_FIELDS:
+        try:
+            year = _valid_year(item[field]["date-parts"][0][0])
+        except (KeyError, IndexError, TypeError):
+            continue
+        if year is not None:
+            return year
+    return None
+
+
+def crossref_record(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Crossref works 条目 → 统一记录。"""
+    title = item.get("title") or []
+    journal = item.get("container-title") or []
+    return {
+        "title": title[0] if title else None,
+        "journal": journal[0] if journal else None,
+        "year": crossref_year(item),
+        "doi": item.get("DOI"),
+        "score": item.get("score"),
+    }
+
+
+# ----------------------------- 抓取器 -----------------------------
+
+class LiteratureFetcher:
+    """PubMed / Crossref 异步抓取：令牌桶限速 + 信号量并发 + 线程池执行同步请求。"""
+
+    def __init__(
+        self,
+        cache: ResponseCache,
+        pubmed_base: str = PUBMED_BASE,
+        crossref_base: str = CROSSREF_BASE,
+        api_key: str = "",
+        mailto: str = "",
+        concurrency: int = DEFAULT_CONCURRENCY,
+        pubmed_rate: Optional[float] = None,
+        crossref_rate: float = CROSSREF_RATE,
+        timeout: int = 30,
+        max_retry: int = 3,
+    ) -> None:
+        self.cache = cache
+        self.pubmed_base = pubmed_base.rstrip("/")
+        self.crossref_base = crossref_base.rstrip("/")
+        self.api_key = api_key
+        self.mailto = mailto
+        self.timeout = timeout
+        self.max_retry = max_retry
+        self.concurrency = concurrency
+        if pubmed_rate is None:
+            pubmed_rate = PUBMED_RATE_WITH_KEY if api_key else PUBMED_RATE_NO_KEY
+        self.rates = {"pubmed": pubmed_rate, "crossref": crossref_rate}
+        agent = "CausalSDMs-reference-builder/1.0"
+        self.headers = {"User-Agent": f"{agent} (mailto:{mailto})" if mailto else agent}
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="litfetch")
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.sem: Optional[asyncio.Semaphore] = None
+
+    async def _get(self, service: str, url: str, params: Dict[str, Any], kind: str):
+        """限速 + 并发控制下的 GET；返回 Response，网络层彻底失败时返回 None。"""
+        if self.sem is None:
+            self.sem = asyncio.Semaphore(self.concurrency)
+            self.buckets = {k: TokenBucket(v) for k, v in self.rates.items()}
+        await self.buckets[service].acquire()
+        async with self.sem:
+            loop = asyncio.get_running_loop()
+            call = functools.partial(request_with_retry, "GET", url, params=params, headers=self.headers,
+                                     timeout=self.timeout, max_retry=self.max_retry)
+            sp = instr.start_span(kind, service=service)
+            try:
+                resp = await loop.run_in_executor(self.executor, call)
+            except Exception as e:  # noqa: E722
+                logging.warning("请求失败：%s | 错误：%s", url, e)
+                sp["error"] = str(e)
+                instr.count("request_failures")
+                instr.end_span(sp, status="error")
+                return None
+            sp["http_status"] = resp.status_code
+            sp["bytes"] = len(resp.content)
+            instr.end_span(sp, status="ok" if resp.status_code == 200 else "error")
+            instr.count("requests")
+            return resp
+
+    # ---- PubMed ----
+
+    async def esearch(self, term: str, retmax: int) -> List[str]:
+        ident = f"{term}|{retmax}"
+        cached = self.cache.get("esearch", ident)
+        if cached is not None:
+            return cached
+        params = {"db": "pubmed", "term": term, "retmax": retmax, "retmode": "json"}
+        if self.api_key:
+            params["api_key"] = self.api_key
+        resp = await self._get("pubmed", f"{self.pubmed_base}/esearch.fcgi", params, "pubmed_esearch")
+        if resp is None or resp.status_code != 200:
+            return []
+        try:
+            ids = [str(i) for i in resp.json()["esearchresult"]["idlist"]]
+        except (ValueError, KeyError):
+            logging.warning("esearch 响应无法解析：%s", term)
+            return []
+        self.cache.put("esearch", ident, ids, TTL_SEARCH)
+        return ids
+
+    async def _efetch_batch(self, pmids: List[str]) -> List[Dict[str, Any]]:
+        params = {"db": "pubmed", "id": ",".join(pmids), "rettype": "xml", "retmode": "xml"}
+        if self.api_key:
+            params["api_key"] = self.api_key
+        resp = await self._get("pubmed", f"{self.pubmed_base}/efetch.fcgi", params, "pubmed_efetch")
+        if resp is None or resp.status_code != 200:
+            return []
+        try:
+            return parse_pubmed_xml(resp.text)
+        except ET.ParseError as e:
+            logging.warning("efetch XML 解析失败（%s 个 PMID）：%s", len(pmids), e)
+            return []
+
+    async def pubmed_records(self, pmids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """按 PMID 取文献记录：先查缓存，缺失部分分批 efetch。"""
+        out: Dict[str, Dict[str, Any]] = {}
+        missing: List[str] = []
+        for pmid in dict.fromkeys(pmids):
+            rec = self.cache.get("pubmed", pmid)
+            if rec is not None:
+                out[pmid] = rec
+            else:
+                missing.append(pmid)
+        batches = [missing[i:i + EFETCH_BATCH] for i in range(0, len(missing), EFETCH_BATCH)]
+        results = await asyncio.gather(*(self._efetch_batch(b) for b in batches))
+        for batch, recs in zip(batches, results):
+            if not recs:
+                continue  # 整批失败不写缓存，下次重试
+            found = {r["pmid"]: r for r in recs if r.get("pmid")}
+            for pmid in batch:
+                rec = found.get(pmid, {"pmid": pmid, "missing": True})
+                self.cache.put("pubmed", pmid, rec, TTL_NEGATIVE if rec.get("missing") else TTL_RECORD)
+                out[pmid] = rec
+        return out
+
+    # ---- Crossref ----
+
+    async def crossref_query(self, query: str, rows: int) -> List[Dict[str, Any]]:
+        ident = f"{query}|{rows}"
+        cached = self.cache.get("crossref_query", ident)
+        if cached is not None:
+            return cached
+        params: Dict[str, Any] = {"query": query, "rows": rows}
+        if self.mailto:
+            params["mailto"] = self.mailto
+        resp = await self._get("crossref", f"{self.crossref_base}/works", params, "crossref_query")
+        if resp is None or resp.status_code != 200:
+            return []
+        try:
+            items = [crossref_record(it) for it in resp.json()["message"]["items"]]
+        except (ValueError, KeyError):
+            logging.warning("Crossref 检索响应无法解析：%s", query)
+            return []
+        self.cache.put("crossref_query", ident, items, TTL_SEARCH)
+        return items
+
+    async def resolve_doi(self, doi: str) -> Optional[Dict[str, Any]]:
+        ident = doi.lower()
+        cached = self.cache.get("crossref_doi", ident)
+        if cached is not None:
+            return None if cached.get("missing") else cached
+        params = {"mailto": self.mailto} if self.mailto else {}
+        resp = await self._get("crossref", f"{self.crossref_base}/works/{quote(doi, safe='/:()')}", params, "crossref_doi")
+        if resp is None:
+            return None
+        if resp.status_code == 404:
+            self.cache.put("crossref_doi", ident, {"missing": True}, TTL_NEGATIVE)
+            return None
+        if resp.status_code != 200:
+            return None
+        try:
+            rec = crossref_record(resp.json()["message"])
+        except (ValueError, KeyError):
+            return None
+        self.cache.put("crossref_doi", ident, rec, TTL_RECORD)
+        return rec
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+
+
+# ----------------------------- 检索流程（与 R 端逻辑一致） -----------------------------
+
+def _topic_rows(topic: str, records: List[Dict[str, Any]], source: str, year_min: int) -> List[Dict[str, Any]]:
+    rows = []
+    for r in records:
+        if r.get("missing") or (r.get("year") is not None and r["year"] < year_min):
+            continue
+        rows.append({"kind": "topic", "query": topic, "title": r.get("title"), "journal": r.get("journal"),
+                     "year": r.get("year"), "doi": r.get("doi"), "source": source})
+    return rows
+
+
+def _best_forced(item: Dict[str, Any], hits: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """按得分降序取第一条满足年份下限（或年份缺失）的结果；均不满足时取得分最高者。"""
+    if not hits:
+        return None
+    ranked = sorted(hits, key=lambda h: h.get("score") or 0, reverse=True)
+    year_min = int(item.get("year_min") or 1900)
+    best = next((h for h in ranked if h.get("year") is None or h["year"] >= year_min), ranked[0])
+    return {"kind": "forced", "query": item["title"], "title": best.get("title") or item["title"],
+            "journal": best.get("journal"), "year": best.get("year"), "doi": best.get("doi"),
+            "source": "Crossref"}
+
+
+async def build_references(fetcher: LiteratureFetcher, spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    topics: List[str] = list(spec.get("topics", []))
+    forced: List[Dict[str, Any]] = list(spec.get("forced", []))
+    year_min = int(spec.get("year_min", 2020))
+    max_n = int(spec.get("max_per_topic", 30))
+
+    # 1) PubMed：主题 esearch 并发 → PMID 去重后批量 efetch
+    with instr.span("pubmed", topics=len(topics)) as sp:
+        id_lists = await asyncio.gather(*(fetcher.esearch(t, max_n) for t in topics))
+        all_ids = [i for ids in id_lists for i in ids]
+        records = await fetcher.pubmed_records(all_ids)
+        sp.update(pmids=len(set(all_ids)))
+
+    # 2) 不足 max_n 的主题用 Crossref 兜底；强制收录条目同时检索
+    per_topic = [_topic_rows(t, [records[i] for i in ids if i in records], "PubMed", year_min)
+                 for t, ids in zip(topics, id_lists)]
+    fallback_idx = [k for k, rows in enumerate(per_topic) if len(rows) < max_n]
+    with instr.span("crossref", fallback_topics=len(fallback_idx), forced=len(forced)):
+        cr_results = await asyncio.gather(
+            *(fetcher.crossref_query(topics[k], max_n) for k in fallback_idx),
+            *(fetcher.crossref_query(f"{f['title']} {f.get('author_hint') or ''}".strip(), 5) for f in forced),
+        )
+    for k, items in zip(fallback_idx, cr_results[:len(fallback_idx)]):
+        per_topic[k].extend(_topic_rows(topics[k], items, "Crossref", year_min))
+
+    # 每个主题内按 DOI 去重并剔除无 DOI 条目（与 search_topic 一致）
+    rows: List[Dict[str, Any]] = []
+    for topic_rows in per_topic:
+        seen = set()
+        for r in topic_rows:
+            doi = (r.get("doi") or "").strip()
+            if doi and doi.lower() not in seen:
+                seen.add(doi.lower())
+                rows.append(r)
+    for item, hits in zip(forced, cr_results[len(fallback_idx):]):
+        best = _best_forced(item, hits)
+        if best is not None and best.get("doi"):
+            rows.append(best)
+
+    # 3) 缺少期刊或年份的条目并发做 DOI 解析补全
+    todo = sorted({r["doi"].lower() for r in rows if not r.get("journal") or r.get("year") is None})
+    with instr.span("doi_resolve", dois=len(todo)):
+        resolved = dict(zip(todo, await asyncio.gather(*(fetcher.resolve_doi(d) for d in todo))))
+    for r in rows:
+        hit = resolved.get(r["doi"].lower())
+        if hit:
+            r["journal"] = r.get("journal") or hit.get("journal")
+            r["year"] = r["year"] if r.get("year") is not None else hit.get("year")
+    return rows
+
+
+def write_rows(out_path: Path, rows: List[Dict[str, Any]]) -> None:
+    """原子写出结果表（先写临时文件再替换）。"""
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_suffix(out_path.suffix + ".tmp")
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=OUTPUT_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for r in rows:
+            writer.writerow(r)
+    os.replace(tmp, out_path)
+
+
+# ----------------------------- 主流程 -----------------------------
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="PubMed / Crossref 参考文献元数据异步抓取（限速 + 磁盘缓存）")
+    parser.add_argument("--spec", required=True, help="检索配置 JSON（由 21_reference_builder.R 写出）")
+    parser.add_argument("--out", required=True, help="结果 CSV")
+    parser.add_argument("--cache-dir", default="references/cache/http", help="响应缓存目录")
+    parser.add_argument("--pubmed-base", default=os.environ.get("LITFETCH_PUBMED_BASE", PUBMED_BASE))
+    parser.add_argument("--crossref-base", default=os.environ.get("LITFETCH_CROSSREF_BASE", CROSSREF_BASE))
+    parser.add_argument("--mailto", default=os.environ.get("CROSSREF_MAILTO", ""), help="Crossref polite 池联系邮箱")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="在途请求上限")
+    parser.add_argument("--pubmed-rate", type=float, default=None, help="PubMed 限速（次/秒，默认按是否有密钥）")
+    parser.add_argument("--crossref-rate", type=float, default=CROSSREF_RATE, help="Crossref 限速（次/秒）")
+    parser.add_argument("--timeout", type=int, default=30)
+    parser.add_argument("--max-retry", type=int, default=3)
+    parser.add_argument("--no-cache", action="store_true", help="不读写缓存")
+    parser.add_argument("--refresh", action="store_true", help="忽略已有缓存并重新写入")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s",
+                        handlers=[logging.StreamHandler(sys.stdout)])
+    cache_dir = Path(args.cache_dir)
+    instr.init_run("literature_fetch", cache_dir.parent / "logs", spec=args.spec)
+
+    spec = json.loads(Path(args.spec).read_text(encoding="utf-8"))
+    cache = ResponseCache(cache_dir, enabled=not args.no_cache, refresh=args.refresh)
+    api_key = os.environ.get("PUBMED_API_KEY") or os.environ.get("ENTREZ_KEY") or ""
+    fetcher = LiteratureFetcher(cache, args.pubmed_base, args.crossref_base, api_key=api_key,
+                                mailto=args.mailto, concurrency=args.concurrency,
+                                pubmed_rate=args.pubmed_rate, crossref_rate=args.crossref_rate,
+                                timeout=args.timeout, max_retry=args.max_retry)
+    try:
+        rows = asyncio.run(build_references(fetcher, spec))
+    finally:
+        fetcher.close()
+    failures = instr.summarize().get("counters", {}).get("request_failures", 0)
+    if not rows and failures:
+        # 全部请求失败（网络不可用等）：不覆盖结果文件，以非零退出码通知调用方回退
+        logging.error("请求失败 %s 次且未取得任何条目，结果未写出", failures)
+        instr.finish_run()
+        sys.exit(1)
+    write_rows(Path(args.out), rows)
+    if cache.enabled:
+        removed = cache.purge_expired()
+        if removed:
+            logging.info("已清理过期缓存 %s 条", removed)
+    logging.info("共 %s 条参考文献 → %s", len(rows), args.out)
+    instr.finish_run()
+
+
+if __name__ == "__main__":
+    main()
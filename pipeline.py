@@ -0,0 +1,504 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+基于内容哈希的流程编排脚本（增量重跑编号脚本）
+
+功能概述（中文注释，便于本地二次开发）：
+1. 在 STAGES 中声明每个阶段的命令、输入与输出（支持通配符）；
+2. 阶段间依赖由"输入 ∩ 上游输出"自动推导，无需手写 DAG；
+3. 阶段指纹 = 命令 + 环境变量 + 全部输入文件的内容哈希（SHA-256）；
+   指纹未变且输出文件内容与上次记录一致时跳过该阶段；
+4. 若上游重跑后输出内容未变（如更换一个预测变量后共线性结果不变），
+   下游指纹保持不变，自动截断重建链条；
+5. 相互独立的阶段（四个模型、各 SSP 情景投影）在线程池中并行运行；
+6. 大文件哈希按 (路径, 大小, 修改时间) 缓存，避免每次重算数 GB 栅格；
+7. 状态与各阶段日志保存在 <项目根目录>/.pipeline/ 下，便于溯源。
+
+使用方法（Windows）：
+    python pipeline.py                 # 运行全部过期阶段
+    python pipeline.py --dry-run       # 仅列出将要运行/跳过的阶段
+    python pipeline.py --only 11_current_maps   # 只运行该阶段及其上游
+    python pipeline.py --force 04_collinearity  # 强制重跑该阶段（下游按内容哈希判断）
+    python pipeline.py --jobs 4        # 并行阶段数
+
+注意：
+    - 各 R 脚本内部使用 setwd("E:/SDM01")，因此项目根目录默认同为 E:/SDM01，
+      可通过环境变量 SDM_ROOT 或 --root 覆盖；
+    - Rscript 可执行文件可通过环境变量 RSCRIPT 指定；
+    - 阶段的输入输出声明需与脚本实际读写保持一致，新增脚本时请同步更新 STAGES。
+"""
+
+from __future__ import annotations
+
+import argparse
+import concurrent.futures as cf
+import datetime as dt
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+
+# ----------------------------- 常量与全局配置 -----------------------------
+
+PROJECT_ROOT = Path(os.environ.get("SDM_ROOT", "E:/SDM01"))
+RSCRIPT = os.environ.get("RSCRIPT", "Rscript")
+PYTHON = sys.executable or "python"
+
+STATE_DIRNAME = ".pipeline"
+HASH_CHUNK = 4 * 1024 * 1024
+
+SSP_SCENARIOS = ("SSP126", "SSP245", "SSP370", "SSP585")
+MODELS = ("maxnet", "nn", "rf", "gam")
+ENV_TIFS = "earthenvstreams_china/*.tif"
+VIZ_UTILS = "scripts/visualization/viz_utils.R"
+
+
+@dataclass
+class Stage:
+    """流程阶段声明：命令、输入/输出路径（相对项目根目录，支持通配符）与额外环境变量。
+
+    optional_outputs 为按脚本参数才会生成的输出：参与依赖推导与内容哈希记录，
+    但缺失时不判定阶段失败。
+    """
+
+    name: str
+    cmd: List[str]
+    inputs: List[str]
+    outputs: List[str]
+    env: Dict[str, str] = field(default_factory=dict)
+    optional_outputs: List[str] = field(default_factory=list)
+    deps: Set[str] = field(default_factory=set)
+
+    @property
+    def tracked_outputs(self) -> List[str]:
+        """必需输出 + 可选输出（用于依赖推导与输出哈希记录）。"""
+        return self.outputs + self.optional_outputs
+
+
+def r_stage(name: str, script: str, inputs: List[str], outputs: List[str],
+            env: Optional[Dict[str, str]] = None, optional_outputs: Optional[List[str]] = None) -> Stage:
+    """R 脚本阶段：脚本本身作为输入之一，脚本改动即触发重跑。"""
+    return Stage(name, [RSCRIPT, script], [script] + inputs, outputs, env or {}, optional_outputs or [])
+
+
+def py_stage(name: str, script: str, inputs: List[str], outputs: List[str]) -> Stage:
+    """Python 脚本阶段。"""
+    return Stage(name, [PYTHON, script], [script] + inputs, outputs)
+
+
+def model_stage(name: str, script: str, out_dir: str) -> Stage:
+    """单模型拟合阶段（05/05b/06/07 共用同一输入）。"""
+    return r_stage(name, script, ["output/04_collinearity/collinearity_removed.csv"],
+                   [f"{out_dir}/model.rds", f"{out_dir}/predictions.csv", f"{out_dir}/evaluation.csv"])
+
+
+def build_stages() -> List[Stage]:
+    """声明全部阶段（02 → 03 → 04 → 04b → 05–07 → 11 → 15a → 15；gdw_download.py 为独立阶段）。
+
+    gdw_download.py 的下载结果（data-gdw/）不被任何编号脚本读取，因此不作为 02 的输入。
+    """
+    stages = [
+        py_stage("gdw_download", "gdw_download.py", ["instrumentation.py"], ["data-gdw/manifest_gdw.csv"]),
+        r_stage("02_env_extraction", "scripts/02_env_extraction_and_cleaning.R",
+                ["output/01_data_preparation/species_occurrence_cleaned.csv",
+                 "output/01b_variable_prescreening/qualified_variables.csv",
+                 ENV_TIFS],
+                ["output/02_env_extraction/occurrence_with_env_complete.csv",
+                 "output/02_env_extraction/extracted_variables.csv"]),
+        r_stage("03_background", "scripts/03_background_points.R",
+                ["output/02_env_extraction/occurrence_with_env_complete.csv",
+                 "output/01b_variable_prescreening/qualified_variables.csv",
+                 ENV_TIFS, VIZ_UTILS, "scripts/utils/background_sampler_utils.R"],
+                ["output/03_background_points/background_points.csv",
+                 "output/03_background_points/combined_presence_absence.csv"],
+                # 仅 SAMPLING_STRATEGY = "indexed_block_stratified" 时生成
+                optional_outputs=["output/03_background_points/sampling_index.rds",
+                                  "output/03_background_points/background_replicates.csv"]),
+        r_stage("04_collinearity", "scripts/04_collinearity_analysis.R",
+                ["output/03_background_points/combined_presence_absence.csv",
+                 "scripts/variables_selected_47.csv"],
+                ["output/04_collinearity/collinearity_removed.csv",
+                 "output/04_collinearity/selected_variables.csv"]),
+        py_stage("04b_petal_plot", "scripts/04b_petal_correlation_plot.py",
+                 ["output/04_collinearity/collinearity_removed.csv", "instrumentation.py"],
+                 ["figures/04_collinearity/petal_correlation_plot.png",
+                  "figures/04_collinearity/petal_correlation_plot.pdf"]),
+        model_stage("05_maxnet", "scripts/05_model_maxnet.R", "output/05_model_maxnet"),
+        model_stage("05b_nn", "scripts/05b_model_nn.R", "output/05b_model_nn"),
+        model_stage("06_rf", "scripts/06_model_rf.R", "output/06_model_rf"),
+        model_stage("07_gam", "scripts/07_model_gam.R", "output/07_model_gam"),
+        r_stage("11_current_maps", "scripts/11_current_prediction_maps.R",
+                ["output/05_model_maxnet/model.rds", "output/05b_model_nn/model.rds",
+                 "output/06_model_rf/model.rds", "output/07_model_gam/model.rds",
+                 "output/04_collinearity/selected_variables.csv",
+                 "output/02_env_extraction/extracted_variables.csv",
+                 ENV_TIFS, VIZ_UTILS],
+                [f"output/11_prediction_maps/rasters/pred_{m}_river.tif" for m in MODELS]
+                + ["output/11_prediction_maps/prediction_summary.csv"]),
+        r_stage("15a_retrain_future", "scripts/15a_retrain_future_vars.R",
+                ["output/04_collinearity/collinearity_removed.csv", ENV_TIFS, VIZ_UTILS],
+                [f"output/15_future_env/models/{m}.rds" for m in MODELS]),
+    ]
+    # 各 SSP 情景独立投影（可并行），最后由汇总阶段重建跨情景表与趋势图
+    for ssp in SSP_SCENARIOS:
+        ras = f"output/15_future_env/rasters/{ssp}"
+        stages.append(r_stage(
+            f"15_future_{ssp}", "scripts/15_future_env_projection.R",
+            [f"output/15_future_env/models/{m}.rds" for m in MODELS]
+            + [f"E:/WorldClim/Future/{ssp}/wc2.1_30s_bioc_BCC-CSM2-MR_{ssp.lower()}_2041-2060.tif",
+               ENV_TIFS, VIZ_UTILS],
+            [f"{ras}/pred_{m}_river.tif" for m in MODELS]
+            + [f"{ras}/prediction_summary.csv", f"{ras}/bioc_statistics.csv"],
+            env={"SDM_SSP_SCENARIOS": ssp},
+        ))
+    stages.append(r_stage(
+        "15_future_summary", "scripts/15_future_env_projection.R",
+        [f"output/15_future_env/rasters/{ssp}/{f}" for ssp in SSP_SCENARIOS
+         for f in ("prediction_summary.csv", "bioc_statistics.csv")],
+        ["output/15_future_env/prediction_trends_all_models.csv",
+         "output/15_future_env/future_bioc_statistics.csv"],
+        env={"SDM_SSP_SCENARIOS": "none"},
+    ))
+    return stages
+
+
+# ----------------------------- 工具函数：路径与日志 -----------------------------
+
+def ensure_dir(path: Path) -> None:
+    """确保目录存在，不存在则创建。"""
+    path.mkdir(parents=True, exist_ok=True)
+
+
+def setup_logging(log_dir: Path) -> None:
+    """配置日志输出（文件 + 控制台）。"""
+    ensure_dir(log_dir)
+    log_file = log_dir / f"pipeline_{dt.datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s",
+        handlers=[
+            logging.FileHandler(log_file, encoding="utf-8"),
+            logging.StreamHandler(sys.stdout),
+        ],
+    )
+    logging.info("日志初始化完成：%s", log_file)
+
+
+def resolve(root: Path, pattern: str) -> Path:
+    """相对路径按项目根目录解析，绝对路径（如 E:/WorldClim）原样使用。"""
+    p = Path(pattern)
+    return p if p.is_absolute() else root / p
+
+
+def expand(root: Path, pattern: str) -> List[Path]:
+    """展开通配符，返回排序后的实际文件列表（无通配符时原样返回单个路径）。"""
+    if not any(ch in pattern for ch in "*?["):
+        return [resolve(root, pattern)]
+    p = resolve(root, pattern)
+    return sorted(x for x in p.parent.glob(p.name) if x.is_file())
+
+
+def patterns_overlap(a: str, b: str) -> bool:
+    """判断两个路径声明是否指向同一文件（任一方可含通配符）。"""
+    return a == b or fnmatch.fnmatch(a, b) or fnmatch.fnmatch(b, a)
+
+
+# ----------------------------- 内容哈希 -----------------------------
+
+class HashCache:
+    """文件内容哈希缓存：(大小, 修改时间) 未变则复用上次的 SHA-256。"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.entries: Dict[str, List] = {}
+        if path.exists():
+            try:
+                self.entries = json.loads(path.read_text(encoding="utf-8"))
+            except Exception:  # noqa: E722
+                self.entries = {}
+
+    def file_hash(self, path: Path) -> str:
+        """返回文件内容哈希；文件不存在返回空字符串。"""
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return ""
+        key = str(path)
+        hit = self.entries.get(key)
+        if hit and hit[0] == st.st_size and hit[1] == st.st_mtime_ns:
+            return hit[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        self.entries[key] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def save(self) -> None:
+        ensure_dir(self.path.parent)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.entries), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+def hash_patterns(root: Path, patterns: List[str], cache: HashCache) -> Dict[str, str]:
+    """对一组路径声明计算 {相对路径: 内容哈希}（缺失文件哈希为空字符串）。"""
+    out: Dict[str, str] = {}
+    for pat in patterns:
+        files = expand(root, pat)
+        if not files:
+            out[pat] = ""
+        for f in files:
+            try:
+                rel = f.relative_to(root).as_posix()
+            except ValueError:
+                rel = f.as_posix()
+            out[rel] = cache.file_hash(f)
+    return out
+
+
+def stage_fingerprint(stage: Stage, input_hashes: Dict[str, str]) -> str:
+    """阶段指纹：命令 + 额外环境变量 + 输入内容哈希。"""
+    payload = json.dumps({"cmd": stage.cmd[1:], "env": stage.env, "inputs": input_hashes},
+                         sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ----------------------------- 依赖与调度 -----------------------------
+
+def link_dependencies(stages: List[Stage]) -> None:
+    """由"输入与上游输出重叠"推导依赖；同一输出被多个阶段声明时报错。"""
+    for s in stages:
+        s.deps = set()
+        for t in stages:
+            if t is s:
+                continue
+            if any(patterns_overlap(i, o) for i in s.inputs for o in t.tracked_outputs):
+                s.deps.add(t.name)
+    # 检查环
+    order = topo_order(stages)
+    if len(order) != len(stages):
+        raise RuntimeError("阶段依赖存在环，请检查 STAGES 的输入/输出声明")
+
+
+def topo_order(stages: List[Stage]) -> List[str]:
+    """拓扑排序（保持声明顺序的稳定性）。"""
+    remaining = {s.name: set(s.deps) for s in stages}
+    order: List[str] = []
+    while True:
+        ready = [s.name for s in stages if s.name in remaining and not remaining[s.name]]
+        if not ready:
+            break
+        for n in ready:
+            order.append(n)
+            del remaining[n]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return order
+
+
+def check_stage_names(stages: List[Stage], names: List[str], option: str) -> None:
+    """校验命令行给出的阶段名；存在未知名称时报错并列出全部可用阶段。"""
+    valid = [s.name for s in stages]
+    unknown = [n for n in names if n not in valid]
+    if unknown:
+        raise SystemExit(f"{option} 中存在未知阶段：{', '.join(unknown)}\n可用阶段：{', '.join(valid)}")
+
+
+def select_stages(stages: List[Stage], only: List[str]) -> List[Stage]:
+    """--only：保留指定阶段及其全部上游。"""
+    if not only:
+        return stages
+    by_name = {s.name: s for s in stages}
+    check_stage_names(stages, only, "--only")
+    keep: Set[str] = set()
+    stack = list(only)
+    while stack:
+        n = stack.pop()
+        if n in keep:
+            continue
+        keep.add(n)
+        stack.extend(by_name[n].deps)
+    return [s for s in stages if s.name in keep]
+
+
+def run_stage(stage: Stage, root: Path, log_dir: Path) -> Tuple[int, float]:
+    """在项目根目录下运行阶段命令，输出写入该阶段日志；返回 (退出码, 用时秒)。"""
+    ensure_dir(log_dir)
+    env = dict(os.environ)
+    env.update(stage.env)
+    t0 = time.time()
+    with open(log_dir / f"{stage.name}.log", "w", encoding="utf-8") as log:
+        proc = subprocess.run(stage.cmd, cwd=str(root), env=env, stdout=log,
+                              stderr=subprocess.STDOUT)
+    return proc.returncode, time.time() - t0
+
+
+class Pipeline:
+    """增量执行器：按依赖调度，指纹未变则跳过，就绪阶段并行运行。"""
+
+    def __init__(self, stages: List[Stage], root: Path, jobs: int, force: Set[str],
+                 dry_run: bool) -> None:
+        self.stages = {s.name: s for s in stages}
+        self.order = topo_order(stages)
+        self.root = root
+        self.jobs = max(1, jobs)
+        self.force = force
+        self.dry_run = dry_run
+        self.state_dir = root / STATE_DIRNAME
+        self.state_path = self.state_dir / "state.json"
+        self.cache = HashCache(self.state_dir / "hash_cache.json")
+        self.state: Dict[str, Dict] = {}
+        if self.state_path.exists():
+            try:
+                self.state = json.loads(self.state_path.read_text(encoding="utf-8"))
+            except Exception:  # noqa: E722
+                self.state = {}
+        self.status: Dict[str, str] = {}
+        self.dry_run_planned: Set[str] = set()
+
+    def save_state(self) -> None:
+        ensure_dir(self.state_dir)
+        tmp = self.state_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.state, indent=2, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.state_path)
+        self.cache.save()
+
+    def is_up_to_date(self, stage: Stage, fingerprint: str) -> bool:
+        """指纹一致，必需输出均存在，且全部输出与上次记录的内容哈希一致。"""
+        rec = self.state.get(stage.name)
+        if not rec or rec.get("status") != "ok" or rec.get("fingerprint") != fingerprint:
+            return False
+        required = hash_patterns(self.root, stage.outputs, self.cache)
+        current = hash_patterns(self.root, stage.tracked_outputs, self.cache)
+        return all(required.values()) and current == rec.get("outputs")
+
+    def plan(self, name: str) -> Tuple[str, str]:
+        """返回 (决定, 指纹)：决定为 run / skip。"""
+        stage = self.stages[name]
+        fp = stage_fingerprint(stage, hash_patterns(self.root, stage.inputs, self.cache))
+        upstream_runs = any(d in self.dry_run_planned for d in stage.deps)
+        if name in self.force or upstream_runs or not self.is_up_to_date(stage, fp):
+            return "run", fp
+        return "skip", fp
+
+    def execute(self) -> bool:
+        """主调度循环；返回是否全部成功。"""
+        pending = list(self.order)
+        running: Dict[cf.Future, Tuple[str, str]] = {}
+        log_dir = self.state_dir / "logs"
+        with cf.ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            while pending or running:
+                # 上游失败的阶段标记为阻塞
+                for n in list(pending):
+                    if any(self.status.get(d) in ("failed", "blocked") for d in self.stages[n].deps):
+                        self.status[n] = "blocked"
+                        pending.remove(n)
+                        logging.warning("阻塞（上游失败）：%s", n)
+                # 依赖全部完成的阶段：此时才计算指纹，保证使用上游的最新输出
+                ready = [n for n in pending
+                         if all(self.status.get(d) in ("ok", "skipped") for d in self.stages[n].deps)]
+                for n in ready:
+                    if len(running) >= self.jobs:
+                        break
+                    pending.remove(n)
+                    decision, fp = self.plan(n)
+                    if decision == "skip":
+                        self.status[n] = "skipped"
+                        logging.info("跳过（输入未变）：%s", n)
+                        continue
+                    if self.dry_run:
+                        # 预演：假定上游会运行，下游均视为需要运行
+                        self.status[n] = "ok"
+                        self.dry_run_planned.add(n)
+                        logging.info("将运行：%s | 命令：%s", n, " ".join(self.stages[n].cmd))
+                        continue
+                    logging.info("开始运行：%s", n)
+                    running[pool.submit(run_stage, self.stages[n], self.root, log_dir)] = (n, fp)
+                if not running:
+                    if pending and not ready:
+                        # 仅剩被阻塞/无法满足依赖的阶段
+                        for n in pending:
+                            self.status[n] = "blocked"
+                        pending.clear()
+                    continue
+                done, _ = cf.wait(list(running), return_when=cf.FIRST_COMPLETED)
+                for fut in done:
+                    n, fp = running.pop(fut)
+                    try:
+                        code, wall = fut.result()
+                    except Exception as e:  # noqa: E722
+                        code, wall = -1, 0.0
+                        logging.error("阶段启动失败：%s | 错误：%s", n, e)
+                    stage = self.stages[n]
+                    outputs = hash_patterns(self.root, stage.tracked_outputs, self.cache)
+                    missing = [k for k, v in hash_patterns(self.root, stage.outputs, self.cache).items() if not v]
+                    ok = code == 0 and not missing
+                    self.status[n] = "ok" if ok else "failed"
+                    self.state[n] = {
+                        "status": self.status[n],
+                        "fingerprint": fp,
+                        "outputs": outputs,
+                        "returncode": code,
+                        "wall_sec": round(wall, 2),
+                        "finished": dt.datetime.now().isoformat(timespec="seconds"),
+                    }
+                    self.save_state()
+                    if ok:
+                        logging.info("完成：%s | 用时 %.1f 秒", n, wall)
+                    else:
+                        logging.error("失败：%s | 退出码 %s | 缺失输出 %s | 日志 %s",
+                                      n, code, missing, log_dir / f"{n}.log")
+        if not self.dry_run:
+            self.save_state()
+        return all(v in ("ok", "skipped") for v in self.status.values())
+
+
+# ----------------------------- 主流程 -----------------------------
+
+def main() -> None:
+    """命令行入口。"""
+    parser = argparse.ArgumentParser(description="基于内容哈希的增量流程编排")
+    parser.add_argument("--root", default=str(PROJECT_ROOT), help="项目根目录（默认 E:/SDM01 或 SDM_ROOT）")
+    parser.add_argument("--jobs", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="并行阶段数")
+    parser.add_argument("--only", nargs="*", default=[], help="只运行这些阶段及其上游")
+    parser.add_argument("--force", nargs="*", default=[], help="强制重跑的阶段")
+    parser.add_argument("--dry-run", action="store_true", help="仅列出将要运行/跳过的阶段")
+    parser.add_argument("--list", action="store_true", help="列出全部阶段及依赖后退出")
+    args = parser.parse_args()
+
+    root = Path(args.root).resolve()
+    stages = build_stages()
+    link_dependencies(stages)
+
+    if args.list:
+        for s in stages:
+            print(f"{s.name:24s} <- {', '.join(sorted(s.deps)) or '-'}")
+        return
+
+    check_stage_names(stages, args.force, "--force")
+    setup_logging(root / STATE_DIRNAME / "logs")
+    stages = select_stages(stages, args.only)
+    logging.info("项目根目录：%s | 阶段数：%s | 并行：%s", root, len(stages), args.jobs)
+
+    pipe = Pipeline(stages, root, args.jobs, set(args.force), args.dry_run)
+    ok = pipe.execute()
+    counts: Dict[str, int] = {}
+    for v in pipe.status.values():
+        counts[v] = counts.get(v, 0) + 1
+    logging.info("全部处理完成 | %s", " | ".join(f"{k}={v}" for k, v in sorted(counts.items())))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
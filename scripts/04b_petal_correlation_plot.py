@@ -7,6 +7,8 @@
 参考: 公众号花瓣状热图教程
 输入文件: ../output/04_collinearity/collinearity_removed.csv
 输出文件: ../figures/04_collinearity/petal_correlation.png/pdf
+埋点记录: ../output/04_collinearity/metrics/04b_petal_correlation_*.jsonl（各步骤耗时/峰值内存，
+         汇总 04b_petal_correlation_summary_*.json，可用 instrumentation.py compare 跨运行比较）
 作者: Nature级别科研项目
 日期: 2025-10-14
 ==============================================================================
@@ -24,6 +26,11 @@ from matplotlib.lines import Line2D
 from scipy import stats
 import matplotlib
 import os
+import sys
+
+# 结构化埋点：instrumentation.py 位于项目根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import instrumentation as instr
 
 # 设置字体与PDF格式
 matplotlib.rcParams['pdf.fonttype'] = 42
@@ -76,7 +83,7 @@ COLOR_THEMES = {
 }
 
 # =============================================================================
-# 3. 绘图前的准备
+# 3. 绘图前的准备（参数）
 # =============================================================================
 # 选择配色方案（3 更接近参考图）
 selected_scheme = 3
@@ -88,130 +95,119 @@ selected_method = 'spearman'
 data_directory = r"E:\SDM01\output\04_collinearity"
 output_directory = r"E:\SDM01\figures\04_collinearity"
 
-# 确保输出目录存在
-os.makedirs(output_directory, exist_ok=True)
-
 # 从颜色库里提取配色方案
 select_color = COLOR_THEMES.get(selected_scheme, COLOR_THEMES[1])
 
-print("=" * 80)
-print("花瓣状相关性热图绘制 - 变量组相关性分析")
-print("=" * 80)
-print(f"分析方法: {selected_method.upper()}")
-print(f"配色方案: {selected_scheme}")
-print("")
+# 变量分组前缀
+GROUP_PREFIXES = {
+    'Temperature': ('tmin_avg', 'tmax_avg'),
+    'Precipitation': ('prec_sum',),
+    'Hydroclimatic': ('hydro_avg',),
+    'Topography': ('dem_avg', 'slope_avg', 'flow_'),
+    'LandCover': ('lc_avg',),
+    'Soil': ('soil_avg',),
+    'Geology': ('geo_wsum',)
+}
 
 # =============================================================================
 # 4. 数据读取与变量分组
 # =============================================================================
-print("步骤 1/6: 读取数据并按类型进行变量分组...")
-
-# 读取数据
-data_path = os.path.join(data_directory, "collinearity_removed.csv")
-data = pd.read_csv(data_path)
-
-# 提取环境变量（排除前5列的id, species, lon, lat, source和最后的presence列）
-all_cols = data.columns.tolist()
-# 找到presence列的位置
-presence_idx = [i for i, c in enumerate(all_cols) if 'presence' in c.lower()]
-if len(presence_idx) > 0:
-    env_columns = all_cols[5:presence_idx[0]]
-else:
-    env_columns = all_cols[5:]
-
-env_data = data[env_columns].apply(pd.to_numeric, errors='coerce')
-
-print(f"  - 总变量数: {len(env_columns)}")
-print(f"  - 样本数: {len(data)}")
-
-# 定义变量分组（按真实筛选后的变量）
-var_groups = {
-    'Temperature': [col for col in env_columns if col.startswith('tmin_avg') or col.startswith('tmax_avg')],
-    'Precipitation': [col for col in env_columns if col.startswith('prec_sum')],
-    'Hydroclimatic': [col for col in env_columns if col.startswith('hydro_avg')],
-    'Topography': [col for col in env_columns if col.startswith(('dem_avg', 'slope_avg', 'flow_'))],
-    'LandCover': [col for col in env_columns if col.startswith('lc_avg')],
-    'Soil': [col for col in env_columns if col.startswith('soil_avg')],
-    'Geology': [col for col in env_columns if col.startswith('geo_wsum')]
-}
+def load_env_data(data_path):
+    """读取建模数据，返回 (原始数据, 数值化环境变量表, 环境变量列名)。"""
+    data = pd.read_csv(data_path)
+
+    # 提取环境变量（排除前5列的id, species, lon, lat, source和最后的presence列）
+    all_cols = data.columns.tolist()
+    # 找到presence列的位置
+    presence_idx = [i for i, c in enumerate(all_cols) if 'presence' in c.lower()]
+    if len(presence_idx) > 0:
+        env_columns = all_cols[5:presence_idx[0]]
+    else:
+        env_columns = all_cols[5:]
 
-# 移除空组
-var_groups = {k: v for k, v in var_groups.items() if len(v) > 0}
+    env_data = data[env_columns].apply(pd.to_numeric, errors='coerce')
+    return data, env_data, env_columns
+
+
+def group_variables(env_columns):
+    """按变量名前缀分组，并移除空组。"""
+    var_groups = {
+        name: [col for col in env_columns if col.startswith(prefixes)]
+        for name, prefixes in GROUP_PREFIXES.items()
+    }
+    return {k: v for k, v in var_groups.items() if len(v) > 0}
 
-# 统计每组变量数
-print("\n变量分组统计:")
-for group_name, group_vars in var_groups.items():
-    print(f"  - {group_name}: {len(group_vars)} 个变量")
 
 # =============================================================================
 # 5. 计算分组内变量的汇总代表值（用于跨组相关分析）
 # =============================================================================
-print("\n步骤 2/6: 计算各组代表值（标准化后均值）...")
-
-group_representatives = {}
-for group_name, group_vars in var_groups.items():
-    if len(group_vars) > 0:
-        # 标准化后取均值作为该组的代表值
-        group_data_scaled = (env_data[group_vars] - env_data[group_vars].mean()) / env_data[group_vars].std()
-        group_representatives[group_name] = group_data_scaled.mean(axis=1)
+def compute_group_representatives(env_data, var_groups):
+    """各组变量标准化后取均值，作为该组的代表值。"""
+    group_representatives = {}
+    for group_name, group_vars in var_groups.items():
+        if len(group_vars) > 0:
+            group_data_scaled = (env_data[group_vars] - env_data[group_vars].mean()) / env_data[group_vars].std()
+            group_representatives[group_name] = group_data_scaled.mean(axis=1)
+    return pd.DataFrame(group_representatives)
 
-group_data_df = pd.DataFrame(group_representatives)
 
 # =============================================================================
 # 6. 计算相关性矩阵
 # =============================================================================
-print(f"\n步骤 3/6: 计算{selected_method.upper()}相关系数...")
+def compute_correlations(env_data, group_data_df, var_groups, method=selected_method, verbose=True):
+    """每组的各个变量 vs. 其他组的代表值；返回 {组名: {'correlation_df', 'p_value_df'}}。"""
+    all_correlation_data = {}
+    group_names = list(var_groups.keys())
 
-# 每个分组内变量 vs. 所有分组的相关性
-# 这里我们计算：每组的各个变量 vs. 其他组的代表值
-all_correlation_data = {}
-group_names = list(var_groups.keys())
+    for group_name in group_names:
+        features = var_groups[group_name]
+        if len(features) == 0:
+            continue
 
-for group_name in group_names:
-    features = var_groups[group_name]
-    if len(features) == 0:
-        continue
-    
-    # 目标：其他分组的代表值
-    targets = [g for g in group_names if g != group_name]
-    
-    # 计算相关性矩阵
-    n_features = len(features)
-    n_targets = len(targets)
-    
-    correlation_matrix = np.zeros((n_features, n_targets))
-    p_value_matrix = np.zeros((n_features, n_targets))
-    
-    for i, feature_name in enumerate(features):
-        for j, target_name in enumerate(targets):
-            feature_col = pd.to_numeric(env_data[feature_name], errors='coerce')
-            target_col = pd.to_numeric(group_data_df[target_name], errors='coerce')
-            
-            combined = pd.concat([feature_col, target_col], axis=1).dropna()
-            
-            if len(combined) < 2:
-                corr, p_value = np.nan, np.nan
-            else:
-                if selected_method == 'spearman':
-                    corr, p_value = stats.spearmanr(combined.iloc[:, 0], combined.iloc[:, 1])
-                elif selected_method == 'pearson':
-                    corr, p_value = stats.pearsonr(combined.iloc[:, 0], combined.iloc[:, 1])
+        # 目标：其他分组的代表值
+        targets = [g for g in group_names if g != group_name]
+
+        # 计算相关性矩阵
+        n_features = len(features)
+        n_targets = len(targets)
+
+        correlation_matrix = np.zeros((n_features, n_targets))
+        p_value_matrix = np.zeros((n_features, n_targets))
+
+        for i, feature_name in enumerate(features):
+            for j, target_name in enumerate(targets):
+                feature_col = pd.to_numeric(env_data[feature_name], errors='coerce')
+                target_col = pd.to_numeric(group_data_df[target_name], errors='coerce')
+
+                combined = pd.concat([feature_col, target_col], axis=1).dropna()
+
+                if len(combined) < 2:
+                    corr, p_value = np.nan, np.nan
                 else:
-                    corr, p_value = stats.kendalltau(combined.iloc[:, 0], combined.iloc[:, 1])
-            
-            correlation_matrix[i, j] = corr
-            p_value_matrix[i, j] = p_value
-    
-    # 保存为DataFrame
-    df_corr = pd.DataFrame(correlation_matrix, index=features, columns=targets)
-    df_sig = pd.DataFrame(p_value_matrix < 0.05, index=features, columns=targets)
-    
-    all_correlation_data[group_name] = {
-        'correlation_df': df_corr,
-        'p_value_df': df_sig
-    }
-    
-    print(f"  - {group_name}: {n_features} 个变量 vs. {n_targets} 个目标组")
+                    if method == 'spearman':
+                        corr, p_value = stats.spearmanr(combined.iloc[:, 0], combined.iloc[:, 1])
+                    elif method == 'pearson':
+                        corr, p_value = stats.pearsonr(combined.iloc[:, 0], combined.iloc[:, 1])
+                    else:
+                        corr, p_value = stats.kendalltau(combined.iloc[:, 0], combined.iloc[:, 1])
+
+                correlation_matrix[i, j] = corr
+                p_value_matrix[i, j] = p_value
+
+        # 保存为DataFrame
+        df_corr = pd.DataFrame(correlation_matrix, index=features, columns=targets)
+        df_sig = pd.DataFrame(p_value_matrix < 0.05, index=features, columns=targets)
+
+        all_correlation_data[group_name] = {
+            'correlation_df': df_corr,
+            'p_value_df': df_sig
+        }
+
+        if verbose:
+            print(f"  - {group_name}: {n_features} 个变量 vs. {n_targets} 个目标组")
+
+    return all_correlation_data
+
 
 # =============================================================================
 # 7. 绘图函数
@@ -417,80 +413,131 @@ def create_full_ring_plot(all_data, all_feature_names, all_target_names,
     plt.tight_layout()
     return fig
 
-# =============================================================================
-# 8. 执行绘图
-# =============================================================================
-print("\n步骤 4/6: 绘制花瓣状热图...")
-
-# 设置扇区参数（360度均分）
-n_groups = len(group_names)
-angle_per_group = 360 / n_groups
-gap = 5  # 分组间隙
-
-sector_params = {}
-for i, group_name in enumerate(group_names):
-    start_angle = i * angle_per_group + gap/2
-    end_angle = (i + 1) * angle_per_group - gap/2
-    marker_angle = (start_angle + end_angle) / 2
-    
-    sector_params[group_name] = {
-        'start': start_angle,
-        'end': end_angle,
-        'marker_angle': marker_angle
-    }
-
-# 准备目标字典（每组对应其他组）
-all_target_names = {}
-for group_name in group_names:
-    all_target_names[group_name] = [g for g in group_names if g != group_name]
+def build_sector_params(group_names, gap=5):
+    """扇区参数（360度均分，分组间留间隙）。"""
+    angle_per_group = 360 / len(group_names)
+    sector_params = {}
+    for i, group_name in enumerate(group_names):
+        start_angle = i * angle_per_group + gap/2
+        end_angle = (i + 1) * angle_per_group - gap/2
+        sector_params[group_name] = {
+            'start': start_angle,
+            'end': end_angle,
+            'marker_angle': (start_angle + end_angle) / 2
+        }
+    return sector_params
+
+
+def render_petal_plot(all_correlation_data, var_groups):
+    """绘制花瓣状热图并返回 Figure。"""
+    group_names = list(var_groups.keys())
+    # 准备目标字典（每组对应其他组）
+    all_target_names = {g: [t for t in group_names if t != g] for g in group_names}
+    return create_full_ring_plot(
+        all_data=all_correlation_data,
+        all_feature_names=var_groups,
+        all_target_names=all_target_names,
+        color_palette=select_color,
+        sector_params=build_sector_params(group_names)
+    )
+
+
+def export_tables(all_correlation_data, csv_dir):
+    """将每个变量组的相关性矩阵与显著性矩阵保存为CSV，返回写出字节数。"""
+    os.makedirs(csv_dir, exist_ok=True)
+    nbytes = 0
+    for group_name, tables in all_correlation_data.items():
+        corr_csv = os.path.join(csv_dir, f"{group_name}_correlation.csv")
+        sig_csv = os.path.join(csv_dir, f"{group_name}_significance.csv")
+        tables['correlation_df'].to_csv(corr_csv, index=True)
+        tables['p_value_df'].to_csv(sig_csv, index=True)
+        nbytes += os.path.getsize(corr_csv) + os.path.getsize(sig_csv)
+    return nbytes
 
-# 绘制
-fig = create_full_ring_plot(
-    all_data=all_correlation_data,
-    all_feature_names=var_groups,
-    all_target_names=all_target_names,
-    color_palette=select_color,
-    sector_params=sector_params
-)
 
 # =============================================================================
-# 9. 保存结果
+# 8. 主流程
 # =============================================================================
-print("\n步骤 5/6: 保存图表...")
-
-# 保存PNG（高分辨率）
-png_path = os.path.join(output_directory, "petal_correlation_plot.png")
-fig.savefig(png_path, dpi=1200, bbox_inches='tight', facecolor='white')
-print(f"  - 已保存: {png_path}")
-
-# 保存PDF（矢量图）
-pdf_path = os.path.join(output_directory, "petal_correlation_plot.pdf")
-fig.savefig(pdf_path, bbox_inches='tight', facecolor='white')
-print(f"  - 已保存: {pdf_path}")
-
-# 额外导出：将每个变量组的相关性矩阵与显著性矩阵保存为CSV
-csv_dir = os.path.join(data_directory, "petal_tables")
-os.makedirs(csv_dir, exist_ok=True)
-for group_name in group_names:
-    corr_df = all_correlation_data[group_name]['correlation_df']
-    sig_df = all_correlation_data[group_name]['p_value_df']
-    corr_csv = os.path.join(csv_dir, f"{group_name}_correlation.csv")
-    sig_csv = os.path.join(csv_dir, f"{group_name}_significance.csv")
-    corr_df.to_csv(corr_csv, index=True)
-    sig_df.to_csv(sig_csv, index=True)
-print(f"  - 已保存变量组相关性与显著性表: {csv_dir}")
-
-plt.close()
-
-print("\n步骤 6/6: 总结输出...")
-print("\n" + "=" * 80)
-print("花瓣状相关性热图绘制完成!")
-print("=" * 80)
-print(f"\n变量组数量: {len(group_names)}")
-print(f"变量组: {', '.join(group_names)}")
-print(f"\n输出文件:")
-print(f"  - PNG: {png_path}")
-print(f"  - PDF: {pdf_path}")
-print(f"  - CSV表: {csv_dir}")
-
-print("\n版式: Arial 字体, 蓝-灰-黄配色, 1200 dpi, 单图导出")
+def main():
+    """读取 → 分组 → 代表值 → 相关性 → 绘图 → 保存（各步骤带埋点）。"""
+    # 确保输出目录存在
+    os.makedirs(output_directory, exist_ok=True)
+    instr.init_run("04b_petal_correlation", os.path.join(data_directory, "metrics"),
+                   method=selected_method, scheme=selected_scheme)
+
+    print("=" * 80)
+    print("花瓣状相关性热图绘制 - 变量组相关性分析")
+    print("=" * 80)
+    print(f"分析方法: {selected_method.upper()}")
+    print(f"配色方案: {selected_scheme}")
+    print("")
+
+    print("步骤 1/6: 读取数据并按类型进行变量分组...")
+    data_path = os.path.join(data_directory, "collinearity_removed.csv")
+    with instr.span("load_data", bytes=os.path.getsize(data_path)) as sp:
+        data, env_data, env_columns = load_env_data(data_path)
+        sp.update(rows=len(data), columns=len(env_columns))
+
+    print(f"  - 总变量数: {len(env_columns)}")
+    print(f"  - 样本数: {len(data)}")
+
+    var_groups = group_variables(env_columns)
+    group_names = list(var_groups.keys())
+    print("\n变量分组统计:")
+    for group_name, group_vars in var_groups.items():
+        print(f"  - {group_name}: {len(group_vars)} 个变量")
+
+    print("\n步骤 2/6: 计算各组代表值（标准化后均值）...")
+    with instr.span("group_summary", n_groups=len(var_groups)):
+        group_data_df = compute_group_representatives(env_data, var_groups)
+
+    print(f"\n步骤 3/6: 计算{selected_method.upper()}相关系数...")
+    with instr.span("correlation_compute", method=selected_method, rows=len(env_data)):
+        all_correlation_data = compute_correlations(env_data, group_data_df, var_groups)
+
+    print("\n步骤 4/6: 绘制花瓣状热图...")
+    with instr.span("render", n_groups=len(group_names)):
+        fig = render_petal_plot(all_correlation_data, var_groups)
+
+    print("\n步骤 5/6: 保存图表...")
+    # 保存PNG（高分辨率）
+    png_path = os.path.join(output_directory, "petal_correlation_plot.png")
+    with instr.span("savefig", format="png", dpi=1200) as sp:
+        fig.savefig(png_path, dpi=1200, bbox_inches='tight', facecolor='white')
+        sp["bytes"] = os.path.getsize(png_path)
+    print(f"  - 已保存: {png_path}")
+
+    # 保存PDF（矢量图）
+    pdf_path = os.path.join(output_directory, "petal_correlation_plot.pdf")
+    with instr.span("savefig", format="pdf") as sp:
+        fig.savefig(pdf_path, bbox_inches='tight', facecolor='white')
+        sp["bytes"] = os.path.getsize(pdf_path)
+    print(f"  - 已保存: {pdf_path}")
+
+    # 额外导出：将每个变量组的相关性矩阵与显著性矩阵保存为CSV
+    csv_dir = os.path.join(data_directory, "petal_tables")
+    with instr.span("export_tables") as sp:
+        sp["bytes"] = export_tables(all_correlation_data, csv_dir)
+    print(f"  - 已保存变量组相关性与显著性表: {csv_dir}")
+
+    plt.close()
+
+    print("\n步骤 6/6: 总结输出...")
+    print("\n" + "=" * 80)
+    print("花瓣状相关性热图绘制完成!")
+    print("=" * 80)
+    print(f"\n变量组数量: {len(group_names)}")
+    print(f"变量组: {', '.join(group_names)}")
+    print(f"\n输出文件:")
+    print(f"  - PNG: {png_path}")
+    print(f"  - PDF: {pdf_path}")
+    print(f"  - CSV表: {csv_dir}")
+
+    print("\n版式: Arial 字体, 蓝-灰-黄配色, 1200 dpi, 单图导出")
+
+    # 埋点汇总（耗时/峰值内存/写出字节）
+    instr.finish_run()
+
+
+if __name__ == "__main__":
+    main()
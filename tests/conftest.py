@@ -0,0 +1,8 @@
+"""pytest 公共配置：把仓库根目录加入 sys.path，便于直接导入根目录下的工具模块。"""
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
@@ -0,0 +1,125 @@
+"""benchmark.py 桩服务器的行为测试（仅依赖标准库，离线运行）。"""
+
+import urllib.error
+import urllib.request
+
+import pytest
+
+import benchmark
+from benchmark import StubConfig, parse_byte_range, start_stub_server
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def _start(**kwargs):
+        cfg = StubConfig(depth=0, files_per_page=4, file_size=200 * 1024, **kwargs)
+        server, site, root = start_stub_server(cfg)
+        servers.append(server)
+        return site, root
+
+    yield _start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _get(url, headers=None):
+    req = urllib.request.Request(url, headers=headers or {})
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        return resp.status, dict(resp.headers), resp.read()
+
+
+def _expected(site, start, end):
+    """按服务器的确定性块布局重建 [start, end] 的期望内容。"""
+    block = site.block
+    return bytes(block[i % len(block)] for i in range(start, end + 1))
+
+
+def test_parse_byte_range():
+    assert parse_byte_range("bytes=0-99", 1000) == (0, 99)
+    assert parse_byte_range("bytes=900-", 1000) == (900, 999)
+    assert parse_byte_range("bytes=-100", 1000) == (900, 999)
+    assert parse_byte_range("bytes=990-5000", 1000) == (990, 999)
+    assert parse_byte_range("bytes=1000-", 1000) is None
+    assert parse_byte_range("bytes=50-10", 1000) is None
+    assert parse_byte_range("bytes=-", 1000) is None
+    assert parse_byte_range("items=0-1", 1000) is None
+
+
+def test_full_file_is_deterministic(stub):
+    site, root = stub()
+    status, headers, body = _get(root + "files/000000.zip")
+    assert status == 200
+    assert headers["Accept-Ranges"] == "bytes"
+    assert len(body) == site.cfg.file_size
+    assert body == _expected(site, 0, site.cfg.file_size - 1)
+
+
+def test_range_returns_206_with_content_range(stub):
+    site, root = stub()
+    size = site.cfg.file_size
+    # 跨越 64 KB 块边界，覆盖偏移取数
+    start, end = 65000, 140000
+    status, headers, body = _get(root + "files/000001.zip", {"Range": f"bytes={start}-{end}"})
+    assert status == 206
+    assert headers["Content-Range"] == f"bytes {start}-{end}/{size}"
+    assert int(headers["Content-Length"]) == end - start + 1
+    assert body == _expected(site, start, end)
+
+    # 断点续传：前半段 + 后续 Range 拼接后与完整文件一致
+    _, _, head = _get(root + "files/000002.zip", {"Range": "bytes=0-99999"})
+    status, _, tail = _get(root + "files/000002.zip", {"Range": "bytes=100000-"})
+    assert status == 206
+    _, _, full = _get(root + "files/000002.zip")
+    assert head + tail == full
+
+
+def test_unsatisfiable_range_returns_416(stub):
+    site, root = stub()
+    size = site.cfg.file_size
+    with pytest.raises(urllib.error.HTTPError) as exc:
+        _get(root + "files/000000.zip", {"Range": f"bytes={size}-"})
+    assert exc.value.code == 416
+    assert exc.value.headers["Content-Range"] == f"bytes */{size}"
+
+
+def test_range_disabled_serves_full_file(stub):
+    site, root = stub(range_support=False)
+    status, headers, body = _get(root + "files/000000.zip", {"Range": "bytes=0-9"})
+    assert status == 200
+    assert headers["Accept-Ranges"] == "none"
+    assert len(body) == site.cfg.file_size
+
+
+def test_failure_injection_fails_first_attempts_only(stub):
+    site, root = stub(fail_every=2, fail_attempts=2)
+    injected = [p for p, idx in site.files.items() if idx % 2 == 0]
+    clean = [p for p, idx in site.files.items() if idx % 2 != 0]
+    assert injected and clean
+
+    for path in injected:
+        for _ in range(2):
+            with pytest.raises(urllib.error.HTTPError) as exc:
+                _get(root + path.lstrip("/"))
+            assert exc.value.code == 503
+        status, _, body = _get(root + path.lstrip("/"))
+        assert status == 200 and len(body) == site.cfg.file_size
+    for path in clean:
+        assert _get(root + path.lstrip("/"))[0] == 200
+
+
+def test_unknown_path_returns_404(stub):
+    _, root = stub()
+    with pytest.raises(urllib.error.HTTPError) as exc:
+        _get(root + "files/missing.zip")
+    assert exc.value.code == 404
+
+
+def test_stub_config_from_args_maps_no_range():
+    parser = benchmark.argparse.ArgumentParser()
+    parser.add_argument("--seed", type=int, default=1)
+    benchmark.add_stub_args(parser)
+    cfg = benchmark.stub_config_from_args(parser.parse_args(["--no-range", "--seed", "5"]))
+    assert cfg.range_support is False and cfg.seed == 5
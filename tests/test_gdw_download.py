@@ -0,0 +1,94 @@
+"""gdw_download.download_with_requests 的重试与字节计数测试（本地桩服务器 / 伪会话，离线运行）。"""
+
+import pytest
+import requests
+
+import gdw_download
+import instrumentation as instr
+from benchmark import StubConfig, start_stub_server
+
+
+class _FakeResponse:
+    """流式响应：按给定块产出数据，可在中途抛出连接错误。"""
+
+    def __init__(self, chunks, fail_after=None, total=None):
+        self.status_code = 200
+        self.headers = {"Content-Length": str(total if total is not None else sum(map(len, chunks)))}
+        self._chunks = chunks
+        self._fail_after = fail_after
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_content(self, chunk_size=None):
+        for i, c in enumerate(self._chunks):
+            if self._fail_after is not None and i == self._fail_after:
+                raise requests.ConnectionError("connection reset mid-stream")
+            yield c
+
+
+class _FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def get(self, url, stream=True, timeout=None):
+        self.calls += 1
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def run(tmp_path, monkeypatch):
+    monkeypatch.setattr(gdw_download.time, "sleep", lambda s: None)
+    instr.init_run("test_download", tmp_path / "logs")
+    yield tmp_path
+    if instr._RUN is not None:
+        instr.finish_run(print_summary=False)
+
+
+def test_partial_attempt_bytes_not_counted(run, monkeypatch):
+    chunks = [b"a" * 1000, b"b" * 1000, b"c" * 1000]
+    session = _FakeSession([_FakeResponse(chunks, fail_after=2), _FakeResponse(chunks)])
+    monkeypatch.setattr(gdw_download, "get_session", lambda: session)
+
+    ok, path, size = gdw_download.download_with_requests("http://stub/files/a.zip", run / "out", timeout=5)
+    summary = instr.finish_run(print_summary=False)
+
+    assert ok and size == 3000 and session.calls == 2
+    assert summary["spans"]["download"]["bytes"] == 3000
+    assert summary["spans"]["download"]["retries"] == 1
+    assert summary["counters"]["retries"] == 1
+
+
+def test_final_failure_is_not_counted_as_retry(run, monkeypatch):
+    chunks = [b"x" * 10, b"y" * 10]
+    session = _FakeSession([_FakeResponse(chunks, fail_after=1) for _ in range(3)])
+    monkeypatch.setattr(gdw_download, "get_session", lambda: session)
+
+    ok, _, size = gdw_download.download_with_requests("http://stub/files/b.zip", run / "out", timeout=5,
+                                                      max_retry=3)
+    summary = instr.finish_run(print_summary=False)
+
+    assert not ok and size == 0 and session.calls == 3
+    assert summary["counters"]["retries"] == 2
+    assert summary["counters"]["download_failures"] == 1
+    assert summary["spans"]["download"]["errors"] == 1
+    assert summary["spans"]["download"]["bytes"] == 10
+
+
+def test_injected_503_retried_against_stub(run):
+    cfg = StubConfig(depth=0, files_per_page=2, file_size=128 * 1024, fail_every=1, fail_attempts=1)
+    server, site, root = start_stub_server(cfg)
+    try:
+        ok, path, size = gdw_download.download_with_requests(root + "files/000000.zip", run / "out", timeout=5)
+    finally:
+        server.shutdown()
+        server.server_close()
+    summary = instr.finish_run(print_summary=False)
+
+    assert ok and size == cfg.file_size
+    assert summary["counters"]["retries"] == 1
+    assert summary["spans"]["download"]["bytes"] == cfg.file_size
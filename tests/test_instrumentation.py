@@ -0,0 +1,67 @@
+"""instrumentation.py 的聚合、计数与跨运行比较测试。"""
+
+import json
+
+import pytest
+
+import instrumentation as instr
+
+
+@pytest.fixture(autouse=True)
+def no_active_run():
+    instr._RUN = None
+    yield
+    instr._RUN = None
+
+
+def test_noop_without_run():
+    instr.count("retries")
+    with instr.span("x") as sp:
+        sp["bytes"] = 10
+    assert instr.summarize() == {}
+    assert instr.finish_run() == {}
+
+
+def test_span_aggregation_and_summary_files(tmp_path):
+    jsonl = instr.init_run("unit", tmp_path)
+    for nbytes in (1024 ** 2, 2 * 1024 ** 2):
+        sp = instr.start_span("download", bytes=nbytes, retries=1)
+        instr.end_span(sp)
+    with pytest.raises(ValueError):
+        with instr.span("parse"):
+            raise ValueError("bad input")
+    instr.count("retries", 2)
+    instr.count("retries")
+    summary = instr.finish_run(print_summary=False)
+
+    dl = summary["spans"]["download"]
+    assert dl["count"] == 2 and dl["errors"] == 0
+    assert dl["bytes"] == 3 * 1024 ** 2 and dl["retries"] == 2
+    assert dl["p50_sec"] <= dl["p95_sec"] <= dl["p99_sec"] <= dl["max_sec"]
+    assert summary["spans"]["parse"]["errors"] == 1
+    assert summary["counters"] == {"retries": 3}
+
+    events = [json.loads(line) for line in jsonl.read_text(encoding="utf-8").splitlines()]
+    assert [e["event"] for e in events] == ["run_start", "span", "span", "span", "run_end"]
+    assert events[3]["status"] == "error" and "ValueError" in events[3]["error"]
+    latest = json.loads((tmp_path / "unit_summary_latest.json").read_text(encoding="utf-8"))
+    assert latest["counters"] == {"retries": 3}
+
+
+def test_percentile_interpolates():
+    assert instr._percentile([1.0, 2.0, 3.0, 4.0], 0.5) == 2.5
+    assert instr._percentile([5.0], 0.99) == 5.0
+    assert instr._percentile([], 0.5) != instr._percentile([], 0.5)  # NaN
+
+
+def test_compare_summaries_flags_regressions():
+    span = {"total_sec": 10.0, "p95_sec": 1.0, "max_peak_rss_mb": 100.0}
+    old = {"wall_sec": 10.0, "peak_rss_mb": 100.0, "spans": {"download": span, "gone": span}}
+    new = {"wall_sec": 11.0, "peak_rss_mb": 150.0,
+           "spans": {"download": {"total_sec": 13.0, "p95_sec": 0.9, "max_peak_rss_mb": 100.0}}}
+    rows = {r["metric"]: r for r in instr.compare_summaries(old, new, threshold=0.2)}
+    assert not rows["run.wall_sec"]["regression"]
+    assert rows["run.peak_rss_mb"]["regression"]
+    assert rows["download.total_sec"]["regression"]
+    assert not rows["download.p95_sec"]["regression"]
+    assert not any(m.startswith("gone.") for m in rows)
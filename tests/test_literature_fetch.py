@@ -0,0 +1,230 @@
+"""literature_fetch.py 的行为测试：TTL 缓存、令牌桶、XML 解析，以及对本地替身服务器的端到端抓取。"""
+
+import asyncio
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import literature_fetch as lf
+from literature_fetch import LiteratureFetcher, ResponseCache, TokenBucket, parse_pubmed_xml
+
+
+ARTICLE_101 = """
+  <PubmedArticle>
+    <MedlineCitation>
+      <PMID>101</PMID>
+      <Article>
+        <Journal><Title>Freshwater Biology</Title>
+          <JournalIssue><PubDate><Year>2021</Year></PubDate></JournalIssue></Journal>
+        <ArticleTitle>Fish <i>distribution</i> in rivers</ArticleTitle>
+      </Article>
+    </MedlineCitation>
+    <PubmedData><ArticleIdList>
+      <ArticleId IdType="pubmed">101</ArticleId>
+      <ArticleId IdType="doi">10.1000/fb.101 </ArticleId>
+    </ArticleIdList></PubmedData>
+  </PubmedArticle>"""
+
+ARTICLE_102 = """
+  <PubmedArticle>
+    <MedlineCitation>
+      <PMID>102</PMID>
+      <Article>
+        <Journal><Title>Ecography</Title>
+          <JournalIssue><PubDate><MedlineDate>2019 Nov-Dec</MedlineDate></PubDate></JournalIssue></Journal>
+        <ArticleTitle>No DOI here</ArticleTitle>
+      </Article>
+    </MedlineCitation>
+  </PubmedArticle>"""
+
+
+def _article_set(*articles):
+    return '<?xml version="1.0"?>\n<PubmedArticleSet>' + "".join(articles) + "\n</PubmedArticleSet>\n"
+
+
+# ----------------------------- 单元测试 -----------------------------
+
+def _age_cache(cache_dir, seconds):
+    """把全部缓存条目的写入时间提前 seconds 秒（模拟时间流逝）。"""
+    for path in cache_dir.rglob("*.json"):
+        entry = json.loads(path.read_text(encoding="utf-8"))
+        entry["stored"] -= seconds
+        path.write_text(json.dumps(entry), encoding="utf-8")
+
+
+def test_cache_roundtrip_and_ttl_expiry(tmp_path):
+    cache = ResponseCache(tmp_path)
+    cache.put("esearch", "q|10", ["1", "2"], ttl=100)
+    cache.put("pubmed", "7", {"pmid": "7", "missing": True}, ttl=10)
+    assert cache.get("esearch", "q|10") == ["1", "2"]
+    assert cache.get("pubmed", "7") == {"pmid": "7", "missing": True}
+    assert cache.get("esearch", "other") is None
+
+    _age_cache(tmp_path, 50)
+    assert cache.get("esearch", "q|10") == ["1", "2"]
+    assert cache.get("pubmed", "7") is None          # 短 TTL 的未命中条目先过期
+
+    assert cache.purge_expired() == 1
+    assert cache.get("esearch", "q|10") == ["1", "2"]
+    assert len(list(tmp_path.rglob("*.json"))) == 1
+
+
+def test_cache_disabled_and_refresh(tmp_path):
+    ResponseCache(tmp_path).put("ns", "k", 1, ttl=100)
+    assert ResponseCache(tmp_path, refresh=True).get("ns", "k") is None
+    assert ResponseCache(tmp_path, enabled=False).get("ns", "k") is None
+    ResponseCache(tmp_path, enabled=False).put("ns", "k2", 2, ttl=100)
+    assert ResponseCache(tmp_path).get("ns", "k2") is None
+
+
+def test_token_bucket_limits_rate():
+    async def timed(bucket, n):
+        t0 = time.monotonic()
+        for _ in range(n):
+            await bucket.acquire()
+        return time.monotonic() - t0
+
+    # 容量内的突发立即放行
+    assert asyncio.run(timed(TokenBucket(rate=5, capacity=5), 5)) < 0.1
+    # 超出容量后按 rate 补充：容量 1、20 次/秒时 6 次请求至少需要 5/20 秒
+    assert asyncio.run(timed(TokenBucket(rate=20, capacity=1), 6)) >= 0.24
+
+
+def test_token_bucket_shared_across_tasks():
+    async def run():
+        bucket = TokenBucket(rate=50, capacity=1)
+        t0 = time.monotonic()
+        await asyncio.gather(*(bucket.acquire() for _ in range(11)))
+        return time.monotonic() - t0
+
+    assert asyncio.run(run()) >= 0.19
+
+
+def test_parse_pubmed_xml():
+    recs = parse_pubmed_xml(_article_set(ARTICLE_101, ARTICLE_102))
+    assert recs == [
+        {"pmid": "101", "title": "Fish distribution in rivers", "journal": "Freshwater Biology",
+         "year": 2021, "doi": "10.1000/fb.101"},
+        {"pmid": "102", "title": "No DOI here", "journal": "Ecography", "year": 2019, "doi": None},
+    ]
+
+
+def test_crossref_year_fallback_order():
+    item = {"published-print": {"date-parts": [[None]]}, "issued": {"date-parts": [[2018, 3]]},
+            "created": {"date-parts": [[2017]]}}
+    assert lf.crossref_year(item) == 2018
+    assert lf.crossref_year({}) is None
+
+
+# ----------------------------- 本地替身服务器 -----------------------------
+
+class _StandIn(BaseHTTPRequestHandler):
+    """最小 PubMed eutils / Crossref 替身：记录每个端点的请求次数。"""
+
+    hits = None  # 由 fixture 注入
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _reply(self, status, body, ctype="application/json"):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        qs = parse_qs(url.query)
+        key = url.path
+        self.hits[key] = self.hits.get(key, 0) + 1
+        if url.path == "/eutils/esearch.fcgi":
+            self._reply(200, json.dumps({"esearchresult": {"idlist": ["101", "999"]}}))
+        elif url.path == "/eutils/efetch.fcgi":
+            # PMID 999 不存在：只返回 101（若被请求）
+            ids = qs["id"][0].split(",")
+            self._reply(200, _article_set(*([ARTICLE_101] if "101" in ids else [])), "text/xml")
+        elif url.path == "/crossref/works":
+            items = [{"title": ["Crossref paper"], "container-title": [], "DOI": "10.2000/cr.1",
+                      "issued": {"date-parts": [[2022]]}, "score": 9},
+                     {"title": ["Gone"], "container-title": [], "DOI": "10.2000/gone",
+                      "issued": {"date-parts": [[2023]]}, "score": 1}]
+            self._reply(200, json.dumps({"message": {"items": items}}))
+        elif url.path == "/crossref/works/10.2000/cr.1":
+            self._reply(200, json.dumps({"message": {"title": ["Crossref paper"], "DOI": "10.2000/cr.1",
+                                                     "container-title": ["Hydrobiologia"],
+                                                     "issued": {"date-parts": [[2022]]}}}))
+        else:
+            self._reply(404, json.dumps({"status": "not found"}))
+
+
+@pytest.fixture
+def stand_in():
+    hits = {}
+    handler = type("Handler", (_StandIn,), {"hits": hits})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", hits
+    server.shutdown()
+    server.server_close()
+
+
+SPEC = {"topics": ["river fish"], "forced": [{"title": "Crossref paper", "year_min": 2000}],
+        "year_min": 2000, "max_per_topic": 5}
+
+
+def _build(base, cache_dir):
+    fetcher = LiteratureFetcher(ResponseCache(cache_dir), f"{base}/eutils", f"{base}/crossref",
+                                pubmed_rate=100, crossref_rate=100, max_retry=1, timeout=5)
+    try:
+        return asyncio.run(lf.build_references(fetcher, SPEC))
+    finally:
+        fetcher.close()
+
+
+def test_build_references_served_from_cache_on_rerun(stand_in, tmp_path):
+    base, hits = stand_in
+    rows = _build(base, tmp_path / "http")
+    by_doi = {(r["kind"], r["doi"]): r for r in rows}
+    assert by_doi[("topic", "10.1000/fb.101")]["source"] == "PubMed"
+    assert by_doi[("topic", "10.2000/cr.1")]["journal"] == "Hydrobiologia"   # DOI 解析补全
+    assert by_doi[("forced", "10.2000/cr.1")]["year"] == 2022
+    assert hits["/crossref/works/10.2000/gone"] == 1                          # 404 → 未命中缓存
+    first = dict(hits)
+
+    rows2 = _build(base, tmp_path / "http")
+    assert rows2 == rows
+    assert hits == first                                                     # 第二次全部命中缓存
+
+    # 未命中条目（PMID 999、404 的 DOI）TTL 为 1 天，过期后只重取这两项
+    _age_cache(tmp_path / "http", lf.TTL_NEGATIVE + 60)
+    _build(base, tmp_path / "http")
+    assert hits["/eutils/efetch.fcgi"] == first["/eutils/efetch.fcgi"] + 1
+    assert hits["/crossref/works/10.2000/gone"] == 2
+    assert hits["/eutils/esearch.fcgi"] == first["/eutils/esearch.fcgi"]
+    assert hits["/crossref/works/10.2000/cr.1"] == first["/crossref/works/10.2000/cr.1"]
+
+
+def test_main_exits_nonzero_when_all_requests_fail(tmp_path, monkeypatch):
+    spec = tmp_path / "spec.json"
+    spec.write_text(json.dumps(SPEC), encoding="utf-8")
+    out = tmp_path / "out.csv"
+    out.write_text("previous\n", encoding="utf-8")
+    monkeypatch.setattr(lf.time, "sleep", lambda s: None)
+    monkeypatch.setattr(sys, "argv", [
+        "literature_fetch.py", "--spec", str(spec), "--out", str(out),
+        "--cache-dir", str(tmp_path / "cache" / "http"),
+        "--pubmed-base", "http://127.0.0.1:9/eutils", "--crossref-base", "http://127.0.0.1:9/crossref",
+        "--max-retry", "1", "--timeout", "2",
+    ])
+    with pytest.raises(SystemExit) as exc:
+        lf.main()
+    assert exc.value.code == 1
+    assert out.read_text(encoding="utf-8") == "previous\n"
@@ -0,0 +1,144 @@
+"""pipeline.py 的增量判定测试：内容指纹、下游截断、输出校验、--force 与阶段名校验。"""
+
+import sys
+
+import pytest
+
+import pipeline
+from pipeline import Pipeline, Stage, link_dependencies
+
+
+# 阶段 a：只取输入的第一行写出（第二行变化时输出内容不变，用于测试下游截断）
+SCRIPT_A = """
+from pathlib import Path
+Path("mid.txt").write_text(Path("in.txt").read_text().splitlines()[0])
+"""
+
+# 阶段 b：读取 a 的输出并记录运行次数
+SCRIPT_B = """
+from pathlib import Path
+Path("out.txt").write_text(Path("mid.txt").read_text() + "!")
+with open("runs_b.log", "a") as f:
+    f.write("run\\n")
+"""
+
+
+def make_stages(env_b=None):
+    stages = [
+        Stage("a", [sys.executable, "a.py"], ["a.py", "in.txt"], ["mid.txt"]),
+        Stage("b", [sys.executable, "b.py"], ["b.py", "mid.txt"], ["out.txt"], env=env_b or {}),
+    ]
+    link_dependencies(stages)
+    return stages
+
+
+def run(root, force=(), env_b=None):
+    pipe = Pipeline(make_stages(env_b), root, jobs=2, force=set(force), dry_run=False)
+    ok = pipe.execute()
+    return ok, pipe.status
+
+
+@pytest.fixture
+def project(tmp_path):
+    (tmp_path / "a.py").write_text(SCRIPT_A)
+    (tmp_path / "b.py").write_text(SCRIPT_B)
+    (tmp_path / "in.txt").write_text("alpha\nbeta\n")
+    return tmp_path
+
+
+def b_runs(root):
+    return len((root / "runs_b.log").read_text().splitlines())
+
+
+def test_dependencies_inferred_from_outputs():
+    stages = {s.name: s for s in make_stages()}
+    assert stages["a"].deps == set()
+    assert stages["b"].deps == {"a"}
+
+
+def test_second_run_skips_everything(project):
+    assert run(project) == (True, {"a": "ok", "b": "ok"})
+    assert run(project) == (True, {"a": "skipped", "b": "skipped"})
+    assert b_runs(project) == 1
+
+
+def test_input_change_reruns_and_cuts_off_unchanged_downstream(project):
+    run(project)
+    # 第二行变化：a 重跑，但 mid.txt 内容不变，b 的指纹不变而跳过
+    (project / "in.txt").write_text("alpha\ngamma-delta\n")
+    assert run(project)[1] == {"a": "ok", "b": "skipped"}
+    assert b_runs(project) == 1
+    # 第一行变化：mid.txt 内容改变，b 随之重跑
+    (project / "in.txt").write_text("omega-long\ngamma-delta\n")
+    assert run(project)[1] == {"a": "ok", "b": "ok"}
+    assert (project / "out.txt").read_text() == "omega-long!"
+    assert b_runs(project) == 2
+
+
+def test_script_change_reruns_stage(project):
+    run(project)
+    (project / "b.py").write_text(SCRIPT_B + "\n# edited\n")
+    assert run(project)[1] == {"a": "skipped", "b": "ok"}
+
+
+def test_env_change_changes_fingerprint(project):
+    run(project)
+    assert run(project, env_b={"SDM_SSP_SCENARIOS": "SSP126"})[1] == {"a": "skipped", "b": "ok"}
+    assert run(project, env_b={"SDM_SSP_SCENARIOS": "SSP126"})[1] == {"a": "skipped", "b": "skipped"}
+
+
+def test_tampered_or_missing_output_triggers_rerun(project):
+    run(project)
+    (project / "out.txt").write_text("tampered output")
+    assert run(project)[1] == {"a": "skipped", "b": "ok"}
+    (project / "out.txt").unlink()
+    assert run(project)[1] == {"a": "skipped", "b": "ok"}
+    assert (project / "out.txt").read_text() == "alpha!"
+
+
+def test_force_reruns_stage(project):
+    run(project)
+    assert run(project, force=["b"])[1] == {"a": "skipped", "b": "ok"}
+
+
+def test_failed_stage_blocks_downstream(project):
+    (project / "a.py").write_text("raise SystemExit(3)\n")
+    ok, status = run(project)
+    assert not ok and status == {"a": "failed", "b": "blocked"}
+
+
+def test_optional_outputs_tracked_but_not_required(project):
+    (project / "c.py").write_text('from pathlib import Path\nPath("c_out.txt").write_text("c")\n')
+    stage_c = Stage("c", [sys.executable, "c.py"], ["c.py"], ["c_out.txt"], optional_outputs=["extra.rds"])
+    stage_d = Stage("d", [sys.executable, "-c", "pass"], ["extra.rds"], [])
+    link_dependencies([stage_c, stage_d])
+    assert stage_d.deps == {"c"}
+
+    def run_c():
+        pipe = Pipeline([stage_c], project, jobs=1, force=set(), dry_run=False)
+        return pipe.execute(), pipe.status["c"]
+
+    # 可选输出缺失不算失败，也不妨碍之后跳过
+    assert run_c() == (True, "ok")
+    assert run_c() == (True, "skipped")
+    # 可选输出内容与记录不一致时重跑
+    (project / "extra.rds").write_text("x")
+    assert run_c() == (True, "ok")
+    assert run_c() == (True, "skipped")
+
+
+def test_unknown_stage_names_rejected():
+    stages = make_stages()
+    with pytest.raises(SystemExit) as exc:
+        pipeline.check_stage_names(stages, ["a", "nope"], "--force")
+    assert "nope" in str(exc.value) and "a, b" in str(exc.value)
+    pipeline.check_stage_names(stages, ["a", "b"], "--force")
+
+
+def test_declared_stage_graph_is_acyclic():
+    stages = pipeline.build_stages()
+    link_dependencies(stages)
+    deps = {s.name: s.deps for s in stages}
+    assert deps["02_env_extraction"] == set()
+    assert deps["04_collinearity"] == {"03_background"}
+    assert deps["15_future_summary"] == {f"15_future_{ssp}" for ssp in pipeline.SSP_SCENARIOS}